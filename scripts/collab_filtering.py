@@ -5,27 +5,47 @@ Collaborative filtering script to generate movie recommendations
 based on user ratings stored in a SQLite database.
 """
 
-import sqlite3
 import os
+import json
+import numpy as np
 import pandas as pd
 import random
 from surprise import Dataset, Reader, SVD
 import logging
+from snapshot import load_snapshot_table
+from movie_db import connect_readonly
+from model_store import rating_days, decay_weights
 
 # Suppress Surprise library output
 logging.getLogger('surprise').setLevel(logging.ERROR)
 
+# SVD hyperparameters used when no tuned configuration has been written by tune_svd.py
+DEFAULT_SVD_PARAMS = {'n_factors': 50, 'n_epochs': 25, 'lr_all': 0.005, 'reg_all': 0.02}
+
+# Best configuration found by tune_svd.py
+SVD_PARAMS_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'model', 'svd_params.json')
+
 def load_ratings_from_db(db_path):
     """
     Load ratings data from the SQLite database into a Pandas DataFrame.
+    Reads the memory-mapped columnar snapshot instead when a fresh one exists.
     """
-    conn = sqlite3.connect(db_path)
-    query = """
-    SELECT user_id, movie_id, rating
-    FROM rating;
-    """
-    ratings_df = pd.read_sql_query(query, conn)
-    conn.close()
+    rating = load_snapshot_table(db_path, 'rating')
+    if rating is not None:
+        ratings_df = pd.DataFrame({
+            'user_id': rating['user_id'],
+            'movie_id': rating['movie_id'],
+            'rating': rating['rating'],
+            'rating_date': rating['rating_date'],
+        })
+    else:
+        conn = connect_readonly(db_path)
+        query = """
+        SELECT user_id, movie_id, rating, rating_date
+        FROM rating;
+        """
+        ratings_df = pd.read_sql_query(query, conn)
+        conn.close()
 
     # Ensure user_id and movie_id are strings
     ratings_df['user_id'] = ratings_df['user_id'].astype(str)
@@ -34,16 +54,87 @@ def load_ratings_from_db(db_path):
     return ratings_df
 
 
-def build_collaborative_filtering_model(ratings_df):
+def load_svd_params(params_path=SVD_PARAMS_PATH):
+    """
+    Load the tuned SVD hyperparameters, falling back to the defaults if tuning has not been run.
+    """
+    params = dict(DEFAULT_SVD_PARAMS)
+    if os.path.exists(params_path):
+        with open(params_path, 'r') as f:
+            tuned = json.load(f)
+        params.update({key: tuned[key] for key in DEFAULT_SVD_PARAMS if key in tuned})
+    return params
+
+
+def newest_per_group(groups, days):
+    """
+    Mask of the newest rating in each group (undated ratings count as oldest).
+    """
+    order = np.lexsort((days, groups))
+    last = np.r_[groups[order][1:] != groups[order][:-1], True]
+    newest = np.zeros(len(groups), dtype=bool)
+    newest[order[last]] = True
+    return newest
+
+
+def decayed_sample_mask(users, items, days, half_life_days, reference_day=None):
+    """
+    Choose the ratings SVD trains on when ratings decay (see model_store.decay_weights).
+    Surprise's SVD takes no per-rating weights, so weighted SGD is approximated by sampling
+    without a random generator: each user's ratings are walked oldest first and a rating is
+    kept where the running total of the user's weights crosses a half-integer. A user keeps
+    about the sum of their weights in ratings, and a rating of weight w is kept for a fraction
+    w of possible running totals, so its expected contribution to the SGD updates is
+    proportional to its weight. Each user's and each movie's newest rating is always kept,
+    so no user or movie drops out of the model.
+    Returns a boolean mask over the ratings.
+    """
+    users, items = np.asarray(users), np.asarray(items)
+    days = np.asarray(days, dtype=np.float64)
+    weights, _ = decay_weights(days, half_life_days, reference_day)
+    sort_days = np.where(np.isnan(days), -np.inf, days)
+
+    order = np.lexsort((sort_days, users))
+    sorted_users, sorted_weights = users[order], weights[order].astype(np.float64)
+    starts = np.flatnonzero(np.r_[True, sorted_users[1:] != sorted_users[:-1]])
+    cumulative = np.cumsum(sorted_weights)
+    user_start_totals = np.repeat(cumulative[starts] - sorted_weights[starts], np.diff(np.r_[starts, len(order)]))
+    running = cumulative - user_start_totals
+    crosses = np.floor(running + 0.5) > np.floor(running - sorted_weights + 0.5)
+
+    keep = np.zeros(len(order), dtype=bool)
+    keep[order] = crosses
+    return keep | newest_per_group(users, sort_days) | newest_per_group(items, sort_days)
+
+
+def decayed_sample(ratings_df, half_life_days):
+    """
+    Keep the ratings chosen by decayed_sample_mask.
+    """
+    keep = decayed_sample_mask(
+        pd.factorize(ratings_df['user_id'])[0], pd.factorize(ratings_df['movie_id'])[0],
+        rating_days(ratings_df['rating_date'].to_numpy()), half_life_days
+    )
+    return ratings_df[keep]
+
+
+def build_collaborative_filtering_model(ratings_df, params=None, half_life_days=None):
     """
     Build and train a collaborative filtering model using the SVD algorithm.
+    Uses the tuned hyperparameters from tune_svd.py unless params are given.
+    With a half-life in days, older ratings are down-weighted by sampling (see decayed_sample_mask).
     """
+    if half_life_days:
+        ratings_df = decayed_sample(ratings_df, half_life_days)
+
     reader = Reader(rating_scale=(1, 5))
     data = Dataset.load_from_df(ratings_df[['user_id', 'movie_id', 'rating']], reader)
     trainset = data.build_full_trainset()
 
-    # Use the SVD algorithm with adjusted parameters
-    algo = SVD(n_factors=50, n_epochs=25, lr_all=0.005, reg_all=0.02, random_state=42)
+    if params is None:
+        params = load_svd_params()
+
+    algo = SVD(**params, random_state=42)
     algo.fit(trainset)
 
     return algo
@@ -87,7 +178,7 @@ def get_top_n_recommendations(algo, user_id, ratings_df, db_path, n=10):
     top_n_predictions = predictions[:n]
 
     # Retrieve movie titles from the database
-    conn = sqlite3.connect(db_path)
+    conn = connect_readonly(db_path)
     cur = conn.cursor()
     recommended_movies = []
     for pred in top_n_predictions:
@@ -132,7 +223,7 @@ def main():
 
     # Display the movies the user has rated
     print(f"\nMovies rated by user {user_id}:")
-    conn = sqlite3.connect(db_path)
+    conn = connect_readonly(db_path)
     cur = conn.cursor()
     for idx, row in user_rated_movies.iterrows():
         movie_id = row['movie_id']
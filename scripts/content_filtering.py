@@ -3,22 +3,78 @@ Content-based filtering script to generate movie recommendations
 based on movie features stored in a SQLite database.
 """
 
-import sqlite3
 import os
+import sys
 import pandas as pd
 import numpy as np
 import random
+import scipy.sparse as sp
 from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
+from sklearn.preprocessing import normalize
+from snapshot import load_snapshot_table, decode_strings
+from movie_db import connect_readonly, generation_key
+from model_store import PROFILE_NEUTRAL_RATING
+
+# Size of the hashed overview feature space. Collisions are rare at this size and,
+# since the vectorizer is stateless, no vocabulary has to be kept in memory.
+OVERVIEW_N_FEATURES = 2 ** 18
+
+# Number of overviews read from SQLite and vectorized at a time
+OVERVIEW_CHUNK_SIZE = 5000
+
+overview_vectorizer = HashingVectorizer(
+    n_features=OVERVIEW_N_FEATURES,
+    stop_words='english',
+    alternate_sign=False,
+    norm=None,
+    dtype=np.float32
+)
+
+def load_feature_tables_from_snapshot(db_path, source=None):
+    """
+    Load the movie, genre, director and cast tables from the columnar snapshot,
+    joined the same way as the SQL queries in load_feature_tables.
+    Every table is checked against the same source (a movie_db.generation_key, by default
+    the current one), so they all come from one export; returns None if any is not fresh.
+    """
+    source = source or generation_key(db_path)
+    tables = {}
+    for table in ('movie', 'movie_genre', 'genre', 'movie_director', 'director', 'movie_cast', 'person'):
+        tables[table] = load_snapshot_table(db_path, table, source)
+        if tables[table] is None:
+            return None
 
-def load_movie_features(db_path):
+    def table_frame(table, int_columns=(), string_columns=()):
+        arrays = tables[table]
+        columns = {column: arrays[column] for column in int_columns}
+        columns.update({column: decode_strings(arrays, column) for column in string_columns})
+        return pd.DataFrame(columns)
+
+    movies_df = table_frame('movie', ['movie_id'], ['original_title']).sort_values('movie_id', ignore_index=True)
+
+    genres_df = table_frame('movie_genre', ['movie_id', 'genre_id']).merge(
+        table_frame('genre', ['genre_id'], ['genre_name']), on='genre_id'
+    )[['movie_id', 'genre_name']]
+
+    directors_df = table_frame('movie_director', ['movie_id', 'director_id']).merge(
+        table_frame('director', ['director_id'], ['name']), on='director_id'
+    ).rename(columns={'name': 'director_name'})[['movie_id', 'director_name']]
+
+    cast_df = table_frame('movie_cast', ['movie_id', 'person_id']).merge(
+        table_frame('person', ['person_id'], ['name']), on='person_id'
+    ).rename(columns={'name': 'cast_member_name'})[['movie_id', 'cast_member_name']]
+
+    return movies_df, genres_df, directors_df, cast_df
+
+def load_feature_tables(db_path):
     """
-    Load movie features from the SQLite database into a Pandas DataFrame.
+    Load the movie, genre, director and cast tables from the SQLite database.
     """
-    conn = sqlite3.connect(db_path)
+    conn = connect_readonly(db_path)
 
     # Load movies
-    movies_df = pd.read_sql_query("SELECT movie_id, original_title FROM movie;", conn)
+    movies_df = pd.read_sql_query("SELECT movie_id, original_title FROM movie ORDER BY movie_id;", conn)
 
     # Load genres
     genres_df = pd.read_sql_query("""
@@ -43,6 +99,18 @@ def load_movie_features(db_path):
 
     conn.close()
 
+    return movies_df, genres_df, directors_df, cast_df
+
+def load_movie_features(db_path):
+    """
+    Load movie features from the SQLite database into a Pandas DataFrame.
+    Reads the memory-mapped columnar snapshot instead when a fresh one exists.
+    """
+    tables = load_feature_tables_from_snapshot(db_path)
+    if tables is None:
+        tables = load_feature_tables(db_path)
+    movies_df, genres_df, directors_df, cast_df = tables
+
     # Merge all features into a single DataFrame
     # Start with movies_df
     movies_df['genres'] = movies_df['movie_id'].map(
@@ -68,16 +136,129 @@ def load_movie_features(db_path):
 
     return movies_df
 
-def build_content_based_model(movies_df):
+def hash_overviews(overviews):
     """
-    Build a content-based model using movie features.
+    Convert overview texts into a sparse float32 matrix of hashed term counts.
+    The vectorizer is stateless, so chunks (or newly added movies) can be hashed independently.
+    """
+    overviews = [overview or '' for overview in overviews]
+    return overview_vectorizer.transform(overviews)
+
+def compute_idf(document_frequencies, n_documents):
+    """
+    Compute smoothed inverse document frequencies from per-feature document counts.
+    """
+    return (np.log((1 + n_documents) / (1 + document_frequencies)) + 1).astype(np.float32)
+
+def apply_tfidf(count_matrix, idf):
+    """
+    Weight hashed term counts by IDF and L2-normalise each row.
+    """
+    tfidf_matrix = count_matrix @ sp.diags(idf, format='csr', dtype=np.float32)
+    return normalize(tfidf_matrix, norm='l2', copy=False)
+
+def iter_overview_chunks(cur, chunk_size):
+    """
+    Read (movie_id, overview) rows in movie_id order and yield each chunk's movie_ids
+    and hashed term counts.
+    """
+    cur.execute("SELECT movie_id, overview FROM movie ORDER BY movie_id;")
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            break
+        chunk_ids, chunk_overviews = zip(*rows)
+        yield chunk_ids, hash_overviews(chunk_overviews)
+
+def load_overview_features(db_path, chunk_size=OVERVIEW_CHUNK_SIZE):
+    """
+    Stream movie overviews from the SQLite database in chunks and build a TF-IDF weighted
+    sparse float32 matrix, one row per movie in movie_id order (matching load_movie_features).
+    The overviews are read twice: the first pass counts document frequencies and non-zeros,
+    the second hashes each chunk again and writes its TF-IDF rows straight into preallocated
+    arrays, so besides the result only one chunk's counts are in memory at a time.
+    Returns the movie_ids, the TF-IDF matrix and the IDF vector used to weight it.
+    """
+    conn = connect_readonly(db_path)
+    cur = conn.cursor()
+    # Both passes read inside one transaction, so they see the same movies
+    cur.execute("BEGIN;")
+
+    n_movies = 0
+    nnz = 0
+    document_frequencies = np.zeros(OVERVIEW_N_FEATURES, dtype=np.int64)
+    for chunk_ids, chunk_counts in iter_overview_chunks(cur, chunk_size):
+        # Each row of a CSR matrix lists a feature at most once, so counting
+        # feature indices gives the number of documents containing each feature
+        document_frequencies += np.bincount(chunk_counts.indices, minlength=OVERVIEW_N_FEATURES)
+        n_movies += len(chunk_ids)
+        nnz += chunk_counts.nnz
+
+    idf = compute_idf(document_frequencies, n_movies)
+    movie_ids = np.empty(n_movies, dtype=np.int64)
+    data = np.empty(nnz, dtype=np.float32)
+    indices = np.empty(nnz, dtype=np.int32)
+    indptr = np.zeros(n_movies + 1, dtype=np.int64)
+
+    row = 0
+    for chunk_ids, chunk_counts in iter_overview_chunks(cur, chunk_size):
+        chunk_tfidf = apply_tfidf(chunk_counts, idf)
+        start = indptr[row]
+        data[start:start + chunk_tfidf.nnz] = chunk_tfidf.data
+        indices[start:start + chunk_tfidf.nnz] = chunk_tfidf.indices
+        indptr[row + 1:row + 1 + len(chunk_ids)] = start + chunk_tfidf.indptr[1:]
+        movie_ids[row:row + len(chunk_ids)] = chunk_ids
+        row += len(chunk_ids)
+
+    conn.close()
+
+    overview_matrix = sp.csr_matrix((data, indices, indptr), shape=(n_movies, OVERVIEW_N_FEATURES))
+    return movie_ids, overview_matrix, idf
+
+def load_aligned_overview_features(db_path, movies_df):
+    """
+    Load overview features with rows aligned to movies_df, in case the two reads saw different movies.
+    Movies the overview read did not see get an all-zero row.
+    """
+    overview_movie_ids, overview_matrix, _ = load_overview_features(db_path)
+    row_positions = pd.Series(np.arange(len(overview_movie_ids)), index=overview_movie_ids)
+    rows = row_positions.reindex(movies_df['movie_id']).to_numpy()
+    found = ~np.isnan(rows)
+
+    # A sparse selection matrix picks the found rows and leaves the others empty
+    selection = sp.csr_matrix(
+        (np.ones(found.sum(), dtype=np.float32), (np.flatnonzero(found), rows[found].astype(np.int64))),
+        shape=(len(rows), overview_matrix.shape[0])
+    )
+    return (selection @ overview_matrix).tocsr()
+
+def build_feature_matrix(movies_df, overview_matrix=None, overview_weight=1.0):
+    """
+    Build the sparse movie feature matrix, one L2-normalised row per movie in movies_df.
+    If an overview TF-IDF matrix (rows aligned with movies_df) is given, it is combined with
+    the genre/director/cast features, scaled by overview_weight relative to them.
     """
     # Create a CountVectorizer to convert the text to a matrix of token counts
     count_vectorizer = CountVectorizer(stop_words='english')
     count_matrix = count_vectorizer.fit_transform(movies_df['combined_features'])
 
+    # Normalise the structured features so both families contribute on the same scale
+    feature_matrix = normalize(count_matrix.astype(np.float32), norm='l2')
+
+    if overview_matrix is not None:
+        feature_matrix = sp.hstack([feature_matrix, overview_weight * overview_matrix], format='csr')
+        feature_matrix = normalize(feature_matrix, norm='l2', copy=False)
+
+    return feature_matrix
+
+def build_content_based_model(movies_df, overview_matrix=None, overview_weight=1.0):
+    """
+    Build a content-based model using movie features.
+    """
+    feature_matrix = build_feature_matrix(movies_df, overview_matrix, overview_weight)
+
     # Compute the cosine similarity matrix
-    cosine_sim_matrix = cosine_similarity(count_matrix, count_matrix)
+    cosine_sim_matrix = cosine_similarity(feature_matrix, feature_matrix)
 
     return cosine_sim_matrix
 
@@ -86,7 +267,7 @@ def get_top_n_recommendations(user_id, movies_df, cosine_sim_matrix, db_path, n=
     Get top N movie recommendations for a given user_id.
     """
     # Connect to the database to get user ratings
-    conn = sqlite3.connect(db_path)
+    conn = connect_readonly(db_path)
     ratings_df = pd.read_sql_query("""
     SELECT user_id, movie_id, rating
     FROM rating;
@@ -142,6 +323,64 @@ def get_top_n_recommendations(user_id, movies_df, cosine_sim_matrix, db_path, n=
 
     return recommendations
 
+def build_user_profile(user_ratings, movies_df, feature_matrix):
+    """
+    Build a user's profile directly in feature space: the sum of the normalised feature rows
+    of every movie they rated, weighted by (rating - PROFILE_NEUTRAL_RATING) and scaled by the
+    total absolute weight. Returns a 1 x n_features sparse row, or None if no rating carries weight.
+    """
+    positions = pd.Series(np.arange(len(movies_df)), index=movies_df['movie_id'])
+    rated = user_ratings[user_ratings['movie_id'].isin(positions.index)]
+    weights = rated['rating'].to_numpy(dtype=np.float32) - PROFILE_NEUTRAL_RATING
+    total_weight = np.abs(weights).sum()
+    if total_weight == 0:
+        return None
+
+    rows = positions.loc[rated['movie_id']].to_numpy()
+    return sp.csr_matrix(weights / total_weight) @ feature_matrix[rows]
+
+def get_top_n_profile_recommendations(user_id, movies_df, feature_matrix, db_path, n=10):
+    """
+    Get top N movie recommendations for a given user_id by scoring every movie against the
+    user's feature-space profile with one sparse matrix-vector product.
+    Unlike get_top_n_recommendations this needs no N x N similarity matrix, and it also
+    serves users who have not rated any movie 4.0 or higher.
+    """
+    conn = connect_readonly(db_path)
+    user_ratings = pd.read_sql_query(
+        "SELECT movie_id, rating FROM rating WHERE user_id = ?;", conn, params=(int(user_id),)
+    )
+    conn.close()
+
+    if user_ratings.empty:
+        print(f"No ratings found for user {user_id}.")
+        return []
+
+    user_profile = build_user_profile(user_ratings, movies_df, feature_matrix)
+    if user_profile is None:
+        print(f"User {user_id} has only given neutral ratings.")
+        return []
+
+    scores = (feature_matrix @ user_profile.T).toarray().ravel()
+
+    # Exclude movies the user has already rated
+    scores[movies_df['movie_id'].isin(user_ratings['movie_id']).to_numpy()] = -np.inf
+
+    n = min(n, int(np.isfinite(scores).sum()))
+    if n <= 0:
+        return []
+    top_indices = np.argpartition(-scores, n - 1)[:n]
+    top_indices = top_indices[np.argsort(-scores[top_indices], kind='stable')]
+
+    return [
+        {
+            'movie_id': movies_df.iloc[idx]['movie_id'],
+            'title': movies_df.iloc[idx]['original_title'],
+            'similarity_score': scores[idx]
+        }
+        for idx in top_indices
+    ]
+
 def main():
     # Path to your SQLite database
     db_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'movies.db')
@@ -150,12 +389,23 @@ def main():
     print("Loading movie features...")
     movies_df = load_movie_features(db_path)
 
-    # Build the content-based model
+    # Optionally load overview text features
+    overview_matrix = None
+    if '--overview' in sys.argv:
+        print("Loading overview text features...")
+        overview_matrix = load_aligned_overview_features(db_path, movies_df)
+
+    # Build the content-based model. Profile scoring works on the feature matrix directly,
+    # so the N x N similarity matrix is only computed for the default mode.
+    use_profiles = '--profile' in sys.argv
     print("Building content-based model...")
-    cosine_sim_matrix = build_content_based_model(movies_df)
+    if use_profiles:
+        feature_matrix = build_feature_matrix(movies_df, overview_matrix)
+    else:
+        cosine_sim_matrix = build_content_based_model(movies_df, overview_matrix)
 
     # Get a list of users who have rated movies
-    conn = sqlite3.connect(db_path)
+    conn = connect_readonly(db_path)
     ratings_df = pd.read_sql_query("SELECT DISTINCT user_id FROM rating;", conn)
     conn.close()
     user_ids = ratings_df['user_id'].astype(int).tolist()
@@ -168,7 +418,7 @@ def main():
     user_id = random.choice(user_ids)
 
     # Get the movies the user has rated
-    conn = sqlite3.connect(db_path)
+    conn = connect_readonly(db_path)
     user_ratings = pd.read_sql_query(f"""
     SELECT r.movie_id, r.rating, m.original_title
     FROM rating r
@@ -203,7 +453,10 @@ def main():
 
     # Get the top N recommendations
     print(f"\nGenerating top {top_n} content-based recommendations for user {user_id}...")
-    recommended_movies = get_top_n_recommendations(user_id, movies_df, cosine_sim_matrix, db_path, n=top_n)
+    if use_profiles:
+        recommended_movies = get_top_n_profile_recommendations(user_id, movies_df, feature_matrix, db_path, n=top_n)
+    else:
+        recommended_movies = get_top_n_recommendations(user_id, movies_df, cosine_sim_matrix, db_path, n=top_n)
 
     # Display the recommendations
     if recommended_movies:
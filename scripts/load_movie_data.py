@@ -3,15 +3,20 @@
 """
 Python script to load movie data into a SQLite database defined by movie_schema.sql.
 It downloads the original dataset CSV files and loads data from the Kaggle dataset.
+Each load builds a new WAL-mode database generation and swaps it in only once it is complete
+(see movie_db), so recommenders keep reading the previous data throughout a reload.
 """
 
-import sqlite3
 import csv
 import requests
 import io
 from datetime import datetime
 import os
 import sys
+from movie_search import drop_search_triggers, create_search_triggers, rebuild_search_index
+from movie_db import (
+    new_generation_path, connect_for_build, finish_build, publish_generation, remove_database_files, resolve_generation
+)
 
 def create_tables(conn):
     """
@@ -118,70 +123,132 @@ def load_persons(conn, person_names):
             cur.execute(insert_query, (name,))
     conn.commit()
 
+def stage_rows(conn, table, columns, rows):
+    """
+    Bulk-insert raw source rows into an unconstrained temporary staging table.
+    Each row gets its 1-based record_number in the source file and an empty reject_reason.
+    Returns the number of staged rows.
+    """
+    conn.execute(f"DROP TABLE IF EXISTS temp.{table};")
+    conn.execute(f"CREATE TEMP TABLE {table} (record_number INTEGER, {', '.join(columns)}, reject_reason TEXT);")
+    placeholders = ', '.join('?' * (len(columns) + 1))
+    conn.executemany(
+        f"INSERT INTO {table} (record_number, {', '.join(columns)}) VALUES ({placeholders});",
+        ((record_number, *row) for record_number, row in enumerate(rows, start=1))
+    )
+    return conn.execute(f"SELECT COUNT(*) FROM {table};").fetchone()[0]
+
+def validate_staged_rows(conn, table, rules, duplicate_key):
+    """
+    Mark invalid staged rows with the first rule they fail, in one set-based pass.
+    rules is a list of (reason, SQL condition) pairs over the staging table aliased as s.
+    Rows repeating an earlier valid row's duplicate_key (a SQL expression list) are then
+    marked as duplicates, so the first occurrence wins as with INSERT OR IGNORE.
+    """
+    cases = ' '.join(f"WHEN {condition} THEN '{reason}'" for reason, condition in rules)
+    conn.execute(f"UPDATE {table} AS s SET reject_reason = CASE {cases} END;")
+    conn.execute(f"""
+    UPDATE {table} SET reject_reason = 'duplicate row'
+    WHERE record_number IN (
+        SELECT record_number FROM (
+            SELECT record_number,
+                   ROW_NUMBER() OVER (PARTITION BY {duplicate_key} ORDER BY record_number) AS occurrence
+            FROM {table}
+            WHERE reject_reason IS NULL
+        )
+        WHERE occurrence > 1
+    );
+    """)
+
+def record_json(columns):
+    """
+    SQL expression for a staged row's raw values as a JSON object, as stored in load_reject.record.
+    """
+    pairs = ', '.join(f"'{column}', {column}" for column in columns)
+    return f"json_object({pairs})"
+
+def reject_staged_rows(conn, source, table, columns):
+    """
+    Copy the rejected staged rows, with their reasons and raw values, into load_reject
+    and print summary counts. Returns the number of rejected rows.
+    """
+    conn.execute(f"""
+    INSERT INTO load_reject (source, record_number, reason, record)
+    SELECT ?, record_number, reject_reason, {record_json(columns)}
+    FROM {table}
+    WHERE reject_reason IS NOT NULL
+    ORDER BY record_number;
+    """, (source,))
+
+    reason_counts = conn.execute(f"""
+    SELECT reject_reason, COUNT(*) FROM {table}
+    WHERE reject_reason IS NOT NULL
+    GROUP BY reject_reason
+    ORDER BY COUNT(*) DESC;
+    """).fetchall()
+    for reason, count in reason_counts:
+        print(f"  rejected {count} {source} rows: {reason}")
+    return sum(count for _, count in reason_counts)
+
 def load_original_persons(conn, persons_csv_url):
     """
     Insert cast members into the person table from the original dataset.
     Also insert into movie_cast table.
+    Rows are staged and validated in bulk; rejected rows are recorded in load_reject.
     """
-    cur = conn.cursor()
     response = requests.get(persons_csv_url)
     response.raise_for_status()
     f = io.StringIO(response.text)
     reader = csv.DictReader(f)
 
-    for row in reader:
-        movie_id_str = row.get('MovieID', '').strip()
-        cast_id = row.get('CastID', '').strip()
-        name = row.get('Name', '').strip()
-        gender_code = row.get('Gender', '').strip()
-        character_name = row.get('Character', '').strip()
-
-        if not name or not movie_id_str.isdigit():
-            continue  # Skip invalid entries
-
-        movie_id = int(movie_id_str)
-
-        # Map gender code to 'Male' or 'Female'
-        if gender_code == '1':
-            gender = 'Female'
-        elif gender_code == '2':
-            gender = 'Male'
-        else:
-            gender = None  # Could be empty or unknown
-
-        # Insert or update person
-        # Use UPSERT to insert or update gender if necessary
-        insert_person_query = """
-        INSERT INTO person (name, gender)
-        VALUES (?, ?)
-        ON CONFLICT(name) DO UPDATE SET gender = excluded.gender
-        WHERE person.gender IS NULL OR person.gender = '';
-        """
-
-        cur.execute(insert_person_query, (name, gender))
-
-        # Get person_id
-        cur.execute("SELECT person_id FROM person WHERE name = ?", (name,))
-        person_id_row = cur.fetchone()
-        if person_id_row:
-            person_id = person_id_row[0]
-        else:
-            continue  # Should not happen
-
-        # Insert into movie_cast
-        # character_name can be None
-        insert_movie_cast_query = """
-        INSERT OR IGNORE INTO movie_cast (movie_id, person_id, character_name)
-        VALUES (?, ?, ?);
-        """
-
-        try:
-            cur.execute(insert_movie_cast_query, (movie_id, person_id, character_name))
-        except sqlite3.IntegrityError as e:
-            print(f"Skipping movie_cast insertion due to foreign key constraint: {e}")
-            continue
-
+    columns = ['movie_id', 'name', 'gender', 'character_name']
+    staged = stage_rows(conn, 'staging_person', columns, (
+        (
+            row.get('MovieID', '').strip(),
+            row.get('Name', '').strip(),
+            row.get('Gender', '').strip(),
+            row.get('Character', '').strip(),
+        )
+        for row in reader
+    ))
+
+    validate_staged_rows(conn, 'staging_person', [
+        ('missing name', "s.name = ''"),
+        ('invalid movie_id', "s.movie_id = '' OR s.movie_id GLOB '*[^0-9]*'"),
+        ('unknown movie_id', "NOT EXISTS (SELECT 1 FROM movie m WHERE m.movie_id = CAST(s.movie_id AS INTEGER))"),
+        ('cast entry already loaded', """EXISTS (
+            SELECT 1 FROM movie_cast mc JOIN person p ON mc.person_id = p.person_id
+            WHERE mc.movie_id = CAST(s.movie_id AS INTEGER) AND p.name = s.name
+        )"""),
+    ], duplicate_key="CAST(movie_id AS INTEGER), name")
+
+    # Insert persons in file order; a person's gender is taken from the first row that has one.
+    # Gender codes: 1 is Female, 2 is Male, anything else unknown.
+    conn.execute("""
+    INSERT INTO person (name, gender)
+    SELECT name, CASE gender WHEN '1' THEN 'Female' WHEN '2' THEN 'Male' END
+    FROM staging_person
+    WHERE reject_reason IS NULL
+    ORDER BY record_number
+    ON CONFLICT(name) DO UPDATE SET gender = excluded.gender
+    WHERE person.gender IS NULL OR person.gender = '';
+    """)
+
+    # Link each valid row's person to its movie
+    loaded = conn.execute("""
+    INSERT INTO movie_cast (movie_id, person_id, character_name)
+    SELECT m.movie_id, p.person_id, s.character_name
+    FROM staging_person s
+    JOIN movie m ON m.movie_id = CAST(s.movie_id AS INTEGER)
+    JOIN person p ON p.name = s.name
+    WHERE s.reject_reason IS NULL
+    ORDER BY s.record_number;
+    """).rowcount
+
+    rejected = reject_staged_rows(conn, 'persons', 'staging_person', columns)
+    conn.execute("DROP TABLE temp.staging_person;")
     conn.commit()
+    print(f"Persons: {staged} rows staged, {loaded} cast entries loaded, {rejected} rejected.")
 
 def load_movies(conn, movies_csv_url):
     """
@@ -405,9 +472,8 @@ def load_kaggle_data(conn, kaggle_csv_file):
         load_genres(conn, genres_set)
         load_persons(conn, actors_set)
 
-        # Reset file reader
+        # Reset file reader; the new DictReader reads the header line again itself
         f.seek(0)
-        next(f)  # Skip header line
         reader = csv.DictReader(f, skipinitialspace=True)
 
         # Second pass: Insert movies and related data
@@ -531,61 +597,110 @@ def load_kaggle_data(conn, kaggle_csv_file):
 
     conn.commit()
 
+def normalise_date(date_str):
+    """
+    Return a date string as zero-padded YYYY-MM-DD, accepting single-digit months and days,
+    or None if it is not a valid date.
+    """
+    try:
+        return datetime.strptime(date_str, '%Y-%m-%d').date().isoformat()
+    except ValueError:
+        return None
+
 def load_ratings(conn, ratings_csv_url):
     """
     Insert ratings into the rating table.
+    Rows are staged and validated in bulk; rejected rows are recorded in load_reject.
+    Dates are staged as raw text and normalised to YYYY-MM-DD as they are merged, so
+    single-digit months and days are accepted as before. Ratings whose date does not parse
+    are loaded without it rather than rejected, and recorded in load_reject as well.
     """
-    cur = conn.cursor()
     response = requests.get(ratings_csv_url)
     response.raise_for_status()
     f = io.StringIO(response.text)
     reader = csv.DictReader(f)
-    insert_user_query = """
-    INSERT OR IGNORE INTO user (user_id)
-    VALUES (?);
-    """
-    insert_rating_query = """
-    INSERT OR IGNORE INTO rating (user_id, movie_id, rating, rating_date)
-    VALUES (?, ?, ?, ?);
-    """
-    for row in reader:
-        user_id_str = row.get('UserID', '').strip()
-        movie_id_str = row.get('MovieID', '').strip()
-        rating_str = row.get('Rating', '').strip()
-        date_str = row.get('Date', '').strip()
-
-        if not (user_id_str.isdigit() and movie_id_str.isdigit() and rating_str):
-            continue  # Skip invalid entries
-
-        user_id = int(user_id_str)
-        movie_id = int(movie_id_str)
-        rating = float(rating_str)
-        try:
-            rating_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-        except ValueError:
-            rating_date = None
-
-        # Insert user
-        cur.execute(insert_user_query, (user_id,))
-        # Insert rating
-        try:
-            cur.execute(insert_rating_query, (user_id, movie_id, rating, rating_date))
-        except sqlite3.IntegrityError as e:
-            print(f"Skipping rating insertion due to foreign key constraint: {e}")
-            continue
 
+    columns = ['user_id', 'movie_id', 'rating', 'rating_date']
+    staged = stage_rows(conn, 'staging_rating', columns, (
+        (
+            row.get('UserID', '').strip(),
+            row.get('MovieID', '').strip(),
+            row.get('Rating', '').strip(),
+            row.get('Date', '').strip(),
+        )
+        for row in reader
+    ))
+
+    # A rating is digits with at most one decimal point, so CAST reads all of it rather than
+    # a numeric prefix such as the 4 of '4..5'; the range rule mirrors the CHECK on rating.rating
+    validate_staged_rows(conn, 'staging_rating', [
+        ('invalid user_id', "s.user_id = '' OR s.user_id GLOB '*[^0-9]*'"),
+        ('invalid movie_id', "s.movie_id = '' OR s.movie_id GLOB '*[^0-9]*'"),
+        ('invalid rating', """s.rating = '' OR s.rating GLOB '*[^0-9.]*' OR s.rating GLOB '*.*.*'
+            OR s.rating NOT GLOB '*[0-9]*' OR NOT (
+            CAST(s.rating AS REAL) >= 0.5 AND CAST(s.rating AS REAL) <= 5.0
+            AND CAST(s.rating AS REAL) * 2 = CAST(CAST(s.rating AS REAL) * 2 AS INTEGER)
+        )"""),
+        ('unknown movie_id', "NOT EXISTS (SELECT 1 FROM movie m WHERE m.movie_id = CAST(s.movie_id AS INTEGER))"),
+        ('rating already loaded', """EXISTS (
+            SELECT 1 FROM rating r
+            WHERE r.user_id = CAST(s.user_id AS INTEGER) AND r.movie_id = CAST(s.movie_id AS INTEGER)
+        )"""),
+    ], duplicate_key="CAST(user_id AS INTEGER), CAST(movie_id AS INTEGER)")
+
+    conn.execute("""
+    INSERT OR IGNORE INTO user (user_id)
+    SELECT DISTINCT CAST(user_id AS INTEGER)
+    FROM staging_rating
+    WHERE reject_reason IS NULL;
+    """)
+
+    conn.create_function('normalise_date', 1, normalise_date, deterministic=True)
+    loaded = conn.execute("""
+    INSERT INTO rating (user_id, movie_id, rating, rating_date)
+    SELECT CAST(s.user_id AS INTEGER), m.movie_id, CAST(s.rating AS REAL),
+           normalise_date(s.rating_date)
+    FROM staging_rating s
+    JOIN movie m ON m.movie_id = CAST(s.movie_id AS INTEGER)
+    WHERE s.reject_reason IS NULL
+    ORDER BY s.record_number;
+    """).rowcount
+
+    # Loaded ratings whose date was dropped are recorded too, with the raw date
+    undated = conn.execute(f"""
+    INSERT INTO load_reject (source, record_number, reason, record)
+    SELECT 'ratings', record_number, 'invalid rating_date, loaded without it',
+           {record_json(columns)}
+    FROM staging_rating
+    WHERE reject_reason IS NULL AND rating_date != '' AND normalise_date(rating_date) IS NULL
+    ORDER BY record_number;
+    """).rowcount
+
+    rejected = reject_staged_rows(conn, 'ratings', 'staging_rating', columns)
+    conn.execute("DROP TABLE temp.staging_rating;")
     conn.commit()
+    print(f"Ratings: {staged} rows staged, {loaded} loaded ({undated} without their invalid date), "
+          f"{rejected} rejected.")
 
-def main():
-    try:
-        # Connect to SQLite database
+def main(db_path=None):
+    """
+    Load every dataset into a new database generation and publish it as db_path.
+    Readers keep using the current generation until the new one is complete and swapped in.
+    """
+    conn = None
+    if db_path is None:
         db_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'movies.db')
-        conn = sqlite3.connect(db_path)
-        conn.execute('PRAGMA foreign_keys = ON;')  # Enforce foreign key constraints
+    build_path = new_generation_path(db_path)
+    try:
+        # Build into a fresh WAL-mode file; the live database is not touched
+        conn = connect_for_build(build_path)
 
-        # Create tables (drops existing tables first)
+        # Create tables
         create_tables(conn)
 
+        # Index movies once in bulk at the end rather than row by row as they are inserted
+        search_triggers = drop_search_triggers(conn)
+
         # GitHub raw URLs for the CSV files
         movies_csv_url = 'https://raw.githubusercontent.com/tugraz-isds/datasets/master/movies/Movies.csv'
         persons_csv_url = 'https://raw.githubusercontent.com/tugraz-isds/datasets/master/movies/Persons.csv'
@@ -604,13 +719,25 @@ def main():
         kaggle_csv_file = 'imdb_top_1000.csv'  # Ensure this file is placed in the data directory
         load_kaggle_data(conn, kaggle_csv_file)
 
-        print("Data loaded successfully.")
+        # Build the full-text search index in bulk now that all movies are present,
+        # then restore the triggers so later changes to movie keep it in sync
+        print("Building full-text search index...")
+        rebuild_search_index(conn)
+        create_search_triggers(conn, search_triggers)
+
+        finish_build(conn)
+        conn = None
+        publish_generation(build_path, db_path)
+        print(f"Data loaded successfully into {build_path}; {db_path} now points to it.")
 
     except Exception as e:
         print(f"Error loading data: {e}")
+        print("The live database was left unchanged.")
     finally:
         if conn:
             conn.close()
+        if resolve_generation(db_path) != os.path.realpath(build_path):
+            remove_database_files(build_path)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,786 @@
+# scripts/model_store.py
+
+"""
+Persist trained recommender models as plain NumPy arrays and attach them as read-only
+memory maps. Every worker process that attaches a model shares the same physical pages
+through the OS page cache, so per-worker resident memory stays near-constant no matter
+how large the model is. Scoring here needs only NumPy and the published arrays.
+Each publish writes a complete new generation directory and atomically repoints the model
+directory (a symlink, or a pointer file) at it, as the loader does for the database (see movie_db).
+"""
+
+import os
+import shutil
+import numpy as np
+
+from movie_db import connect_readonly, new_generation_path, publish_generation, resolve_generation
+
+# Default locations of the published models
+MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'model')
+COLLAB_MODEL_DIR = os.path.join(MODEL_DIR, 'collab')
+CONTENT_MODEL_DIR = os.path.join(MODEL_DIR, 'content')
+
+# Rating scale used to clip collaborative filtering estimates, as Surprise does
+RATING_SCALE = (1, 5)
+
+# Ratings at or above this value count as liked for content-based profiles
+LIKED_RATING_THRESHOLD = 4.0
+
+# Rating that carries no preference in rating-weighted ('profile') content scoring;
+# higher ratings pull the profile towards a movie's features, lower ratings push it away
+PROFILE_NEUTRAL_RATING = 3.0
+
+# Half-life in days of time-decayed rating weights (see decay_weights); None disables decay
+RATING_HALF_LIFE_DAYS = None
+
+# Bounds on the exponent of a decay weight. Weights stay within float32's normal range, so a
+# very old rating keeps a tiny weight instead of 0 and a rating newer than the reference day
+# stays finite
+DECAY_EXPONENT_LIMIT = 120
+
+# Collaborative filtering scores are computed in blocks of this many movies
+SCORE_BLOCK_SIZE = 256
+
+# Scoring methods: 'collab' uses the SVD model; 'content' scores against the average of the
+# movies a user liked; 'profile' scores against a rating-weighted profile of every rated movie
+METHOD_MODEL_DIRS = {'collab': COLLAB_MODEL_DIR, 'content': CONTENT_MODEL_DIR, 'profile': CONTENT_MODEL_DIR}
+SCORE_KEYS = {'collab': 'estimated_rating', 'content': 'similarity_score', 'profile': 'similarity_score'}
+
+
+def save_arrays(arrays, model_dir):
+    """
+    Write each array to <model_dir>/<name>.npy.
+    Files are written under a temporary name and renamed into place, so a worker
+    attaching concurrently never sees a partially written array.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    for name, array in arrays.items():
+        path = os.path.join(model_dir, f"{name}.npy")
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.asarray(array), allow_pickle=False)
+        os.replace(tmp_path, path)
+
+
+def publish_arrays(arrays, model_dir, extend=False):
+    """
+    Publish arrays as a new generation of model_dir: write them into a fresh directory, then
+    atomically repoint model_dir at it. A worker attaching during a publish sees either the old
+    model or the new one, never a mix, and arrays from earlier publishes never linger.
+    With extend, the current generation's other arrays are carried over by hard link;
+    published files are never modified, so generations can share them.
+    """
+    if os.path.isdir(model_dir) and not os.path.islink(model_dir):
+        # A model published before generations were used becomes the oldest generation
+        old_generation = new_generation_path(model_dir)
+        os.makedirs(os.path.dirname(old_generation), exist_ok=True)
+        os.replace(model_dir, old_generation)
+
+    build_dir = new_generation_path(model_dir)
+    save_arrays(arrays, build_dir)
+    current_dir = resolve_generation(model_dir)
+    if extend and os.path.isdir(current_dir):
+        for filename in os.listdir(current_dir):
+            target = os.path.join(build_dir, filename)
+            if filename.endswith('.npy') and not os.path.exists(target):
+                try:
+                    os.link(os.path.join(current_dir, filename), target)
+                except OSError:
+                    shutil.copyfile(os.path.join(current_dir, filename), target)
+    publish_generation(build_dir, model_dir)
+
+
+def load_arrays(model_dir):
+    """
+    Attach every array in model_dir as a read-only memory map.
+    Nothing is copied into the process; pages are faulted in from the shared page cache on access.
+    model_dir is resolved to its current generation once, so all arrays come from the same
+    publish even if a new one is swapped in meanwhile.
+    """
+    model_dir = resolve_generation(model_dir)
+    arrays = {}
+    for filename in sorted(os.listdir(model_dir)):
+        if filename.endswith('.npy'):
+            name = filename[:-len('.npy')]
+            arrays[name] = np.load(os.path.join(model_dir, filename), mmap_mode='r', allow_pickle=False)
+    return arrays
+
+
+def sparse_to_arrays(prefix, matrix):
+    """
+    Split a CSR matrix into its component arrays so it can be saved and memory-mapped.
+    """
+    matrix = matrix.tocsr()
+    return {
+        f"{prefix}_data": matrix.data,
+        f"{prefix}_indices": matrix.indices,
+        f"{prefix}_indptr": matrix.indptr,
+        f"{prefix}_shape": np.array(matrix.shape, dtype=np.int64),
+    }
+
+
+def sparse_from_arrays(arrays, prefix):
+    """
+    Rebuild a CSR matrix view over memory-mapped component arrays without copying them.
+    """
+    import scipy.sparse as sp
+
+    shape = tuple(int(dim) for dim in arrays[f"{prefix}_shape"])
+    matrix = sp.csr_matrix(shape, dtype=arrays[f"{prefix}_data"].dtype)
+    # Assign the components directly; the constructor would copy and validate them
+    matrix.data = arrays[f"{prefix}_data"]
+    matrix.indices = arrays[f"{prefix}_indices"]
+    matrix.indptr = arrays[f"{prefix}_indptr"]
+    return matrix
+
+
+def load_movie_titles(db_path, movie_ids):
+    """
+    Look up original titles for the given movie_ids as a fixed-width string array
+    (which, unlike an object array, can be memory-mapped).
+    """
+    conn = connect_readonly(db_path)
+    titles_by_id = dict(conn.execute("SELECT movie_id, original_title FROM movie;").fetchall())
+    conn.close()
+    return np.array([titles_by_id.get(int(movie_id), '') for movie_id in movie_ids], dtype=str)
+
+
+def rating_days(dates):
+    """
+    Convert rating dates (datetime64 values, 'YYYY-MM-DD' strings or None) to days since
+    1970-01-01 as floats, with NaN for undated ratings.
+    """
+    dates = np.asarray(dates)
+    if not np.issubdtype(dates.dtype, np.datetime64):
+        dates = np.array([date if date else 'NaT' for date in dates], dtype='datetime64[D]')
+    dates = dates.astype('datetime64[D]')
+    days = dates.astype(np.int64).astype(np.float64)
+    days[np.isnat(dates)] = np.nan
+    return days
+
+
+def decay_weights(days, half_life_days, reference_day=None):
+    """
+    Time-decay weight of each rating: 2 ** ((day - reference_day) / half_life_days), so a
+    rating counts half as much for every half-life it is older than the reference day.
+    reference_day defaults to the newest rating's day, which then has weight 1; undated
+    ratings are not decayed. The exponent is computed in float64 and clamped to
+    +-DECAY_EXPONENT_LIMIT. Returns float32 weights and the reference day.
+    Weights against different reference days differ by one common factor (see decay_factor),
+    so aggregates of them never need recomputing as the clock advances.
+    """
+    days = np.asarray(days, dtype=np.float64)
+    dated = ~np.isnan(days)
+    if reference_day is None:
+        reference_day = float(days[dated].max()) if dated.any() else 0.0
+    weights = np.ones(len(days), dtype=np.float32)
+    exponents = np.clip((days[dated] - reference_day) / half_life_days, -DECAY_EXPONENT_LIMIT, DECAY_EXPONENT_LIMIT)
+    weights[dated] = np.exp2(exponents)
+    return weights, reference_day
+
+
+def decay_factor(from_day, to_day, half_life_days):
+    """
+    Factor that brings a sum of decay weights computed against from_day up to date as of to_day.
+    Every rating decays by the same factor as the clock advances, so decayed sums, counts and
+    means are advanced with one multiplication instead of being recomputed from the ratings,
+    and normalised aggregates such as content profiles do not change at all.
+    """
+    return float(np.exp2(-(to_day - from_day) / half_life_days))
+
+
+def advance_decay_weights(weights, from_day, to_day, half_life_days):
+    """
+    Rebase decay weights computed against from_day onto to_day with one decay_factor,
+    clamped to the same range as decay_weights. Returns float32 weights.
+    """
+    factor = decay_factor(from_day, to_day, half_life_days)
+    limits = np.exp2([-DECAY_EXPONENT_LIMIT, DECAY_EXPONENT_LIMIT])
+    return np.clip(np.asarray(weights, dtype=np.float64) * factor, *limits).astype(np.float32)
+
+
+def load_rating_arrays(db_path, movie_ids, half_life_days=RATING_HALF_LIFE_DAYS):
+    """
+    Load the rating table as a per-user CSR layout over positions in movie_ids (which must be sorted).
+    Returns the sorted user_ids plus indptr, movie-position and rating arrays.
+    Ratings for movies outside movie_ids are dropped.
+    With a half-life, the time-decay weight of every rating is computed in the same pass
+    (see decay_weights) and stored with the reference day and half-life it was computed for.
+    """
+    from snapshot import load_snapshot_table
+
+    rating = load_snapshot_table(db_path, 'rating')
+    if rating is not None:
+        order = np.lexsort((rating['movie_id'], rating['user_id']))
+        user_col = rating['user_id'][order]
+        movie_col = rating['movie_id'][order]
+        rating_col = rating['rating'][order].astype(np.float32)
+        day_col = rating_days(rating['rating_date'][order]) if half_life_days else None
+    else:
+        conn = connect_readonly(db_path)
+        rows = conn.execute("""
+        SELECT user_id, movie_id, rating, rating_date FROM rating ORDER BY user_id, movie_id;
+        """).fetchall()
+        conn.close()
+
+        rating_rows = np.array([row[:3] for row in rows], dtype=np.float64).reshape(-1, 3)
+        user_col = rating_rows[:, 0].astype(np.int64)
+        movie_col = rating_rows[:, 1].astype(np.int64)
+        rating_col = rating_rows[:, 2].astype(np.float32)
+        day_col = rating_days([row[3] for row in rows]) if half_life_days else None
+
+    # Keep only ratings of movies present in the model
+    positions = np.searchsorted(movie_ids, movie_col)
+    positions = np.minimum(positions, len(movie_ids) - 1)
+    known = movie_ids[positions] == movie_col if len(movie_ids) else np.zeros(len(movie_col), dtype=bool)
+    user_col, positions, rating_col = user_col[known], positions[known], rating_col[known]
+
+    user_ids, counts = np.unique(user_col, return_counts=True)
+    indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    arrays = {
+        'rating_user_ids': user_ids,
+        'rating_indptr': indptr,
+        'rating_items': positions.astype(np.int32),
+        'rating_values': rating_col,
+    }
+    if half_life_days:
+        weights, reference_day = decay_weights(day_col[known], half_life_days)
+        arrays['rating_weights'] = weights
+        arrays['rating_reference_day'] = np.array(reference_day, dtype=np.float64)
+        arrays['rating_half_life_days'] = np.array(half_life_days, dtype=np.float64)
+    return arrays
+
+
+def user_ratings(model, user_id):
+    """
+    Return the (movie positions, ratings) a user has given, or empty arrays for an unknown user.
+    """
+    user_ids = model['rating_user_ids']
+    row = np.searchsorted(user_ids, user_id)
+    if row >= len(user_ids) or user_ids[row] != user_id:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+    start, end = model['rating_indptr'][row], model['rating_indptr'][row + 1]
+    return model['rating_items'][start:end], model['rating_values'][start:end]
+
+
+def lookup_rows(sorted_ids, ids):
+    """
+    Find the row of each id in a sorted id array.
+    Returns the rows and a mask of which ids were found; rows of missing ids are meaningless.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(sorted_ids) == 0:
+        return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool)
+    rows = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return rows, sorted_ids[rows] == ids
+
+
+def batch_rated_items(model, user_ids):
+    """
+    Collect the ratings of every user in a batch without a Python loop.
+    Returns parallel arrays of batch rows, movie positions, ratings and time-decay weights
+    (all 1 for a model published without decay).
+    """
+    rows, known = lookup_rows(model['rating_user_ids'], user_ids)
+    indptr = model['rating_indptr']
+    starts = np.where(known, indptr[rows], 0)
+    counts = np.where(known, indptr[rows + 1] - starts, 0)
+
+    batch_rows = np.repeat(np.arange(len(rows)), counts)
+    # Offset of each rating within its user's slice, added to that user's start
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    offsets = np.repeat(starts, counts) + within
+    if 'rating_weights' in model:
+        weights = model['rating_weights'][offsets]
+    else:
+        weights = np.ones(len(offsets), dtype=np.float32)
+    return batch_rows, model['rating_items'][offsets], model['rating_values'][offsets], weights
+
+
+def top_n_positions_batch(scores, exclude_rows, exclude_items, ns, masks=None):
+    """
+    Return, for each row of a score matrix, positions of its n highest scores, best first,
+    skipping excluded (row, position) pairs. ns gives each row's n, and masks optionally
+    gives each row a boolean filter mask (None for no filter) of allowed positions.
+    scores is modified in place.
+    """
+    scores[exclude_rows, exclude_items] = -np.inf
+    masked_rows = [row for row, mask in enumerate(masks or []) if mask is not None]
+    if masked_rows:
+        # Filter every masked row in one pass: rows' masks stacked into a boolean matrix
+        allowed = np.stack([masks[row] for row in masked_rows])
+        scores[masked_rows] = np.where(allowed, scores[masked_rows], -np.inf)
+    k = min(max(ns, default=0), scores.shape[1])
+    if k <= 0:
+        return [np.empty(0, dtype=np.int64) for _ in ns]
+
+    # One partition over the whole batch finds each row's k-th best score; everything scoring
+    # more is a candidate, and ties at that score are taken in position order up to n.
+    # Breaking ties by position keeps the ranking deterministic, and identical when sharded,
+    # and heavy ties (such as all-zero scores) never yield more than n candidates.
+    kth_scores = -np.partition(-scores, k - 1, axis=1)[:, k - 1]
+    top_positions = []
+    for row_scores, kth_score, n in zip(scores, kth_scores, ns):
+        above = np.flatnonzero(row_scores > kth_score)
+        if kth_score > -np.inf:
+            ties = np.flatnonzero(row_scores == kth_score)[:max(n - len(above), 0)]
+            above = np.concatenate([above, ties])
+        order = np.lexsort((above, -row_scores[above]))
+        top_positions.append(above[order][:n])
+    return top_positions
+
+
+def range_masks(masks, start, end):
+    """
+    Restrict filter masks to catalog positions [start, end). Masks may span the whole
+    catalog or already cover just the range, as sharded workers receive them.
+    """
+    if masks is None:
+        return None
+    return [mask if mask is None or len(mask) == end - start else mask[start:end] for mask in masks]
+
+
+def categorical_masks(values):
+    """
+    Dictionary-encode a column of category values into sorted names plus one boolean
+    row per name marking the movies with that value. None values match no name.
+    """
+    names = sorted({value for value in values if value})
+    masks = np.zeros((len(names), len(values)), dtype=bool)
+    name_rows = {name: row for row, name in enumerate(names)}
+    for position, value in enumerate(values):
+        if value:
+            masks[name_rows[value], position] = True
+    return np.array(names, dtype=str), masks
+
+
+def load_attribute_arrays(db_path, movie_ids):
+    """
+    Build the filterable movie attributes over positions in movie_ids (which must be sorted):
+    one membership mask per genre, language and certificate, and release year and runtime
+    as small integer columns (0 where unknown). Year and runtime ranges are a single
+    vectorised comparison each, so they need no bucketing.
+    """
+    conn = connect_readonly(db_path)
+    movie_rows = conn.execute("""
+    SELECT movie_id, CAST(strftime('%Y', release_date) AS INTEGER), runtime,
+           original_language_code, certificate
+    FROM movie;
+    """).fetchall()
+    genre_rows = conn.execute("""
+    SELECT mg.movie_id, g.genre_name
+    FROM movie_genre mg
+    JOIN genre g ON mg.genre_id = g.genre_id;
+    """).fetchall()
+    conn.close()
+
+    year = np.zeros(len(movie_ids), dtype=np.int16)
+    runtime = np.zeros(len(movie_ids), dtype=np.int16)
+    languages = [None] * len(movie_ids)
+    certificates = [None] * len(movie_ids)
+    rows, known = lookup_rows(movie_ids, [row[0] for row in movie_rows])
+    for position, is_known, (_, release_year, movie_runtime, language, certificate) in zip(rows, known, movie_rows):
+        if is_known:
+            year[position] = release_year or 0
+            runtime[position] = movie_runtime or 0
+            languages[position] = language
+            certificates[position] = certificate
+
+    genre_names = sorted({genre for _, genre in genre_rows})
+    genre_masks = np.zeros((len(genre_names), len(movie_ids)), dtype=bool)
+    if genre_rows:
+        genre_index = {genre: row for row, genre in enumerate(genre_names)}
+        positions, known = lookup_rows(movie_ids, [movie_id for movie_id, _ in genre_rows])
+        genre_ids = np.array([genre_index[genre] for _, genre in genre_rows])
+        genre_masks[genre_ids[known], positions[known]] = True
+
+    language_names, language_masks = categorical_masks(languages)
+    certificate_names, certificate_masks = categorical_masks(certificates)
+
+    return {
+        'attr_year': year,
+        'attr_runtime': runtime,
+        'attr_genre_names': np.array(genre_names, dtype=str),
+        'attr_genre_masks': genre_masks,
+        'attr_language_names': language_names,
+        'attr_language_masks': language_masks,
+        'attr_certificate_names': certificate_names,
+        'attr_certificate_masks': certificate_masks,
+    }
+
+
+def category_masks(model, attribute, names):
+    """
+    Stack the masks of the named values of a categorical attribute, one row per name.
+    Names are matched case-insensitively.
+    Raises ValueError listing every unknown name, or if the model has no such attribute.
+    """
+    if f"attr_{attribute}_names" not in model:
+        raise ValueError(f"The published model has no {attribute} attributes; retrain it to filter by {attribute}")
+    known_names = [str(name) for name in model[f"attr_{attribute}_names"]]
+    rows_by_name = {name.casefold(): row for row, name in enumerate(known_names)}
+    unknown = [name for name in names if name.casefold() not in rows_by_name]
+    if unknown:
+        raise ValueError(f"Unknown {attribute} {', '.join(map(repr, unknown))}; "
+                         f"choose from: {', '.join(known_names)}")
+    rows = [rows_by_name[name.casefold()] for name in names]
+    return model[f"attr_{attribute}_masks"][rows]
+
+
+def build_filter_mask(model, genres=(), min_year=None, max_year=None, languages=(), certificates=(),
+                      min_runtime=None, max_runtime=None):
+    """
+    Combine query-time constraints into one boolean mask over the model's movies.
+    A movie must have every listed genre, any listed language and any listed certificate,
+    and fall inside the year and runtime ranges (movies with unknown values are excluded
+    by a range constraint). Returns None when no constraint is given.
+    Raises ValueError for an unknown genre, language or certificate (matched case-insensitively).
+    """
+    mask = np.ones(len(model['movie_ids']), dtype=bool)
+    constrained = False
+
+    if genres:
+        mask &= category_masks(model, 'genre', genres).all(axis=0)
+        constrained = True
+    if languages:
+        mask &= category_masks(model, 'language', languages).any(axis=0)
+        constrained = True
+    if certificates:
+        mask &= category_masks(model, 'certificate', certificates).any(axis=0)
+        constrained = True
+
+    for column, low, high in (('attr_year', min_year, max_year), ('attr_runtime', min_runtime, max_runtime)):
+        if low is not None:
+            mask &= model[column] >= low
+            constrained = True
+        if high is not None:
+            mask &= (model[column] <= high) & (model[column] > 0)
+            constrained = True
+
+    return mask if constrained else None
+
+
+def export_collab_arrays(algo, db_path, half_life_days=RATING_HALF_LIFE_DAYS):
+    """
+    Extract a trained Surprise SVD model into arrays ordered by movie_id and user_id.
+    The rated-movie arrays come from the full rating table rather than the trainset,
+    which holds only a sample of the ratings when training used time decay.
+    """
+    trainset = algo.trainset
+    n_items = trainset.n_items
+
+    # Raw ids are the string forms used by collab_filtering; store them as integers
+    item_raw_ids = np.array([int(trainset.to_raw_iid(i)) for i in range(n_items)], dtype=np.int64)
+    user_raw_ids = np.array([int(trainset.to_raw_uid(u)) for u in range(trainset.n_users)], dtype=np.int64)
+
+    # Reorder items by movie_id so lookups can use binary search
+    item_order = np.argsort(item_raw_ids)
+    movie_ids = item_raw_ids[item_order]
+
+    # Reorder users by user_id for the same reason
+    user_order = np.argsort(user_raw_ids)
+
+    arrays = {
+        'global_mean': np.array(trainset.global_mean, dtype=np.float64),
+        'user_ids': user_raw_ids[user_order],
+        'user_factors': algo.pu[user_order],
+        'user_biases': algo.bu[user_order],
+        'movie_ids': movie_ids,
+        'item_factors': algo.qi[item_order],
+        'item_biases': algo.bi[item_order],
+        'titles': load_movie_titles(db_path, movie_ids),
+    }
+    arrays.update(load_attribute_arrays(db_path, movie_ids))
+
+    # Items each user has rated, as positions in movie_ids
+    arrays.update(load_rating_arrays(db_path, movie_ids, half_life_days))
+
+    return arrays
+
+
+def predict_collab_scores_batch(model, user_ids, start=0, end=None):
+    """
+    Estimate every user's rating of the movies at positions [start, end) of the model,
+    mirroring SVD.predict: global mean plus biases plus the factor dot product, clipped to
+    the rating scale. Unknown users get the baseline of global mean plus item bias.
+    All known users are scored with one matrix-matrix product.
+    """
+    end = len(model['movie_ids']) if end is None else end
+    rows, known = lookup_rows(model['user_ids'], user_ids)
+    scores = np.empty((len(rows), end - start), dtype=np.float64)
+    scores[:] = model['global_mean'] + model['item_biases'][start:end]
+    if known.any():
+        known_rows = rows[known]
+        user_factors = model['user_factors'][known_rows]
+        scores[known] += model['user_biases'][known_rows][:, None]
+
+        # Multiply in fixed blocks of positions aligned to SCORE_BLOCK_SIZE. BLAS results can
+        # differ in the last bit with the shape of the operands, so aligned blocks make a
+        # movie's score independent of which range it was scored as part of.
+        block_start = start
+        while block_start < end:
+            block_end = min((block_start // SCORE_BLOCK_SIZE + 1) * SCORE_BLOCK_SIZE, end)
+            scores[known, block_start - start:block_end - start] += (
+                user_factors @ model['item_factors'][block_start:block_end].T
+            )
+            block_start = block_end
+    return np.clip(scores, *RATING_SCALE, out=scores)
+
+
+def predict_collab_scores(model, user_id):
+    """
+    Estimate the user's rating of every movie in the model.
+    """
+    return predict_collab_scores_batch(model, [user_id])[0]
+
+
+def score_top_n_batch(model, method, user_ids, ns, masks=None, start=0, end=None, quantized=False,
+                      profile_cache=None):
+    """
+    Score the movies at positions [start, end) of a model with the given method for a batch
+    of users and select each user's top n, skipping movies they rated and movies outside
+    their filter mask (spanning the model or just [start, end), see range_masks).
+    Returns one (positions, scores) pair per user, with positions
+    relative to the whole model so results from different ranges can be merged.
+    With quantized=True (collab only) candidates are selected with the model's quantized
+    factors and re-ranked exactly (see quantized_scoring). Content profiles are taken from
+    profile_cache when one is given.
+    """
+    if quantized:
+        from quantized_scoring import quantized_score_top_n_batch
+        return quantized_score_top_n_batch(model, method, user_ids, ns, masks, start, end)
+
+    end = len(model['movie_ids']) if end is None else end
+
+    if method in ('content', 'profile'):
+        profiles, has_profile, rated_rows, rated_items = batch_profiles(model, method, user_ids, profile_cache)
+        scores = content_scores_batch(model, profiles, start, end)
+    else:
+        rated_rows, rated_items, _, _ = batch_rated_items(model, user_ids)
+        scores = predict_collab_scores_batch(model, user_ids, start, end)
+        has_profile = np.ones(len(user_ids), dtype=bool)
+
+    in_range = (rated_items >= start) & (rated_items < end)
+    top_positions = top_n_positions_batch(scores, rated_rows[in_range], rated_items[in_range] - start, ns,
+                                          range_masks(masks, start, end))
+
+    results = []
+    for user_scores, positions, user_has_profile in zip(scores, top_positions, has_profile):
+        if not user_has_profile:
+            positions = positions[:0]
+        results.append((positions + start, user_scores[positions]))
+    return results
+
+
+def format_recommendations(model, top_n, score_key):
+    """
+    Turn (positions, scores) pairs into recommendation lists of movie_id, title and score.
+    Ids and titles for the whole batch are gathered with one fancy index each, rather
+    than one memory-map lookup per recommended movie.
+    """
+    if not top_n:
+        return []
+    positions = np.concatenate([np.asarray(positions, dtype=np.int64) for positions, _ in top_n])
+    movie_ids = model['movie_ids'][positions].tolist()
+    titles = model['titles'][positions].tolist()
+    scores = np.concatenate([np.asarray(scores, dtype=np.float64) for _, scores in top_n]).tolist()
+
+    results = []
+    offset = 0
+    for user_positions, _ in top_n:
+        end = offset + len(user_positions)
+        results.append([
+            {'movie_id': movie_id, 'title': title, score_key: score}
+            for movie_id, title, score in zip(movie_ids[offset:end], titles[offset:end], scores[offset:end])
+        ])
+        offset = end
+    return results
+
+
+def recommend_batch(model, method, user_ids, ns, masks=None, quantized=False, profile_cache=None):
+    """
+    Get top N recommendations for several users at once with any scoring method.
+    Returns one recommendation list per user.
+    """
+    top_n = score_top_n_batch(model, method, user_ids, ns, masks, quantized=quantized,
+                              profile_cache=profile_cache)
+    return format_recommendations(model, top_n, SCORE_KEYS[method])
+
+
+def recommend_collab_batch(model, user_ids, ns, masks=None):
+    """
+    Get top N collaborative filtering recommendations for several users at once,
+    with ns giving each user's N and masks optionally giving each user's filter mask
+    (see build_filter_mask). Returns one recommendation list per user.
+    """
+    top_n = score_top_n_batch(model, 'collab', user_ids, ns, masks)
+    return format_recommendations(model, top_n, 'estimated_rating')
+
+
+def recommend_collab(model, user_id, n=10, mask=None):
+    """
+    Get top N collaborative filtering recommendations from a published model.
+    """
+    return recommend_collab_batch(model, [user_id], [n], [mask])[0]
+
+
+def export_content_arrays(movies_df, feature_matrix, db_path, half_life_days=RATING_HALF_LIFE_DAYS):
+    """
+    Collect the content-based model arrays: the normalised sparse feature matrix,
+    movie metadata columns and the ratings (with their time-decay weights, given a
+    half-life) used to build user profiles.
+    movies_df must be in movie_id order, as returned by load_movie_features.
+    """
+    movie_ids = movies_df['movie_id'].to_numpy(dtype=np.int64)
+    arrays = {
+        'movie_ids': movie_ids,
+        'titles': movies_df['original_title'].to_numpy(dtype=str),
+    }
+    arrays.update(sparse_to_arrays('features', feature_matrix))
+    arrays.update(load_rating_arrays(db_path, movie_ids, half_life_days))
+    arrays.update(load_attribute_arrays(db_path, movie_ids))
+    return arrays
+
+
+def profile_weights(rated_values, weighting='content'):
+    """
+    Weight of each rating in its user's content profile; 0 for ratings that do not count.
+    With weighting='content' every liked movie counts once, so a profile is the mean of the
+    liked movies' normalised feature rows, which is equivalent to averaging their
+    cosine-similarity rows. With weighting='profile' every rated movie counts with weight
+    (rating - PROFILE_NEUTRAL_RATING), so low ratings count against similar movies and users
+    without any high rating are served too.
+    """
+    rated_values = np.asarray(rated_values, dtype=np.float32)
+    if weighting == 'profile':
+        return rated_values - PROFILE_NEUTRAL_RATING
+    return (rated_values >= LIKED_RATING_THRESHOLD).astype(np.float32)
+
+
+def content_profiles_batch(model, batch_size, rated_rows, rated_items, rated_values, weighting='content',
+                           rated_weights=None):
+    """
+    Build the feature-space profiles of a batch of users, given the batch's ratings from
+    batch_rated_items, as one sparse weight matrix times the feature matrix. Each profile is
+    its ratings' weighted feature rows (see profile_weights, scaled by the ratings' time-decay
+    weights when given) divided by the total absolute weight.
+    Returns the sparse profiles and each user's total weight; users with a total of 0 have
+    an empty profile.
+    """
+    import scipy.sparse as sp
+
+    features = sparse_from_arrays(model, 'features')
+
+    weights = profile_weights(rated_values, weighting)
+    if rated_weights is not None:
+        weights = weights * rated_weights
+    keep = weights != 0
+    weight_rows, weight_items, weights = rated_rows[keep], rated_items[keep], weights[keep]
+
+    totals = np.bincount(weight_rows, weights=np.abs(weights), minlength=batch_size)
+    weight_matrix = sp.csr_matrix(
+        ((weights / totals[weight_rows]).astype(np.float32), (weight_rows, weight_items)),
+        shape=(batch_size, features.shape[0])
+    )
+    return weight_matrix @ features, totals
+
+
+def batch_profiles(model, method, user_ids, profile_cache=None):
+    """
+    Get the content profiles of a batch of users, built from the model's ratings or taken
+    from a profile cache (see profile_cache.ProfileCache).
+    Returns the sparse profiles, a mask of which users have a non-empty profile, and the
+    batch rows and movie positions of every movie the users have rated.
+    """
+    if profile_cache is not None:
+        return profile_cache.profiles_batch(user_ids)
+    rated_rows, rated_items, rated_values, rated_weights = batch_rated_items(model, user_ids)
+    profiles, totals = content_profiles_batch(model, len(user_ids), rated_rows, rated_items,
+                                              rated_values, method, rated_weights)
+    return profiles, totals > 0, rated_rows, rated_items
+
+
+def content_scores_batch(model, profiles, start=0, end=None):
+    """
+    Score the movies at positions [start, end) against a batch of sparse profiles.
+    Profiles live in feature space, so no N x N similarity matrix is needed: the whole
+    batch is scored with one sparse product.
+    """
+    features = sparse_from_arrays(model, 'features')
+    return (profiles @ features[start:end].T).toarray()
+
+
+def recommend_content_batch(model, user_ids, ns, masks=None):
+    """
+    Get top N content-based recommendations for several users at once,
+    with ns giving each user's N and masks optionally giving each user's filter mask
+    (see build_filter_mask). Returns one recommendation list per user;
+    users who have not liked any movie get an empty list.
+    """
+    top_n = score_top_n_batch(model, 'content', user_ids, ns, masks)
+    return format_recommendations(model, top_n, 'similarity_score')
+
+
+def recommend_content(model, user_id, n=10, mask=None):
+    """
+    Get top N content-based recommendations from a published model.
+    """
+    return recommend_content_batch(model, [user_id], [n], [mask])[0]
+
+
+def quantize_published_arrays(arrays, quantize):
+    """
+    Add the quantized item factors of the given dtype ('int8' or 'float16') to a collaborative
+    filtering model's arrays, so they are published in the same generation; None adds nothing.
+    """
+    if quantize:
+        from quantized_scoring import quantize_arrays
+
+        arrays.update(quantize_arrays(arrays, quantize))
+    return arrays
+
+
+def publish_collab_model(db_path, model_dir=COLLAB_MODEL_DIR, half_life_days=RATING_HALF_LIFE_DAYS, quantize=None):
+    """
+    Train the collaborative filtering model and publish its arrays to model_dir.
+    With a half-life in days, training and the published ratings use time-decayed weights.
+    With quantize, quantized item factors of that dtype are published alongside.
+    """
+    # Training needs the full stack; workers attaching the result only need NumPy
+    from collab_filtering import load_ratings_from_db, build_collaborative_filtering_model
+
+    algo = build_collaborative_filtering_model(load_ratings_from_db(db_path), half_life_days=half_life_days)
+    arrays = export_collab_arrays(algo, db_path, half_life_days)
+    publish_arrays(quantize_published_arrays(arrays, quantize), model_dir)
+
+
+def publish_content_model(db_path, model_dir=CONTENT_MODEL_DIR, include_overview=False,
+                          half_life_days=RATING_HALF_LIFE_DAYS):
+    """
+    Build the content-based features and publish the model arrays to model_dir.
+    With a half-life in days, user profiles weight ratings by their time decay.
+    """
+    from content_filtering import load_movie_features, load_aligned_overview_features, build_feature_matrix
+
+    movies_df = load_movie_features(db_path)
+    overview_matrix = load_aligned_overview_features(db_path, movies_df) if include_overview else None
+    feature_matrix = build_feature_matrix(movies_df, overview_matrix)
+    publish_arrays(export_content_arrays(movies_df, feature_matrix, db_path, half_life_days), model_dir)
+
+
+def main():
+    # Path to your SQLite database
+    db_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'movies.db')
+
+    print("Training collaborative filtering model...")
+    publish_collab_model(db_path)
+    print(f"Published collaborative filtering model to {COLLAB_MODEL_DIR}")
+
+    print("Building content-based features...")
+    publish_content_model(db_path)
+    print(f"Published content-based model to {CONTENT_MODEL_DIR}")
+
+
+if __name__ == "__main__":
+    main()
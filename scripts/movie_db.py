@@ -0,0 +1,172 @@
+# scripts/movie_db.py
+
+"""
+Database generations for the movie database.
+The loader never rewrites the live database: it builds a complete new generation file in
+WAL mode next to it and then atomically repoints movies.db (a symlink) at it. Readers open
+read-only connections on the generation movies.db points to when they connect, so they keep
+serving the previous generation while a reload runs and pick up the new one on their next
+connection. Each generation file has its own -wal and -shm files, so generations never share
+WAL state.
+Where symlinks cannot be created (Windows without developer mode), the generation is named
+by a pointer file, movies.db.current, instead; always locate the live generation with
+resolve_generation rather than opening movies.db directly.
+Published model directories use the same generation scheme (see model_store.publish_arrays).
+"""
+
+import sqlite3
+import os
+import shutil
+import time
+from pathlib import Path
+
+# Seconds a replaced generation is kept before it may be pruned, so readers that resolved it
+# just before a publish can still open it and short-lived readers can finish with it
+GENERATION_GRACE_SECONDS = 3600
+
+# Suffix of the pointer file naming the live generation where symlinks are unavailable
+POINTER_SUFFIX = '.current'
+
+
+def generations_dir_for(db_path):
+    """
+    Return the directory holding a database's (or model directory's) generations:
+    'generations' next to it.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'generations')
+
+
+def new_generation_path(db_path):
+    """
+    Return a fresh path for the next generation of a database, named by its build time
+    in nanoseconds so generations sort oldest first.
+    """
+    name, extension = os.path.splitext(os.path.basename(db_path))
+    return os.path.join(generations_dir_for(db_path), f"{name}.{time.time_ns()}{extension}")
+
+
+def connect_for_build(build_path):
+    """
+    Create a new, empty generation file in WAL mode and return a connection to it.
+    """
+    os.makedirs(os.path.dirname(build_path), exist_ok=True)
+    remove_database_files(build_path)
+    conn = sqlite3.connect(build_path)
+    conn.execute('PRAGMA journal_mode = WAL;')
+    conn.execute('PRAGMA foreign_keys = ON;')  # Enforce foreign key constraints
+    return conn
+
+
+def finish_build(conn):
+    """
+    Fold the write-ahead log into the generation file and close the connection,
+    so the published file is complete on its own.
+    """
+    conn.commit()
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE);')
+    conn.close()
+
+
+def resolve_generation(db_path):
+    """
+    Return the path of the generation db_path currently points to: the target named by its
+    pointer file if there is one, otherwise db_path with symlinks resolved.
+    A path that is not published as generations resolves to itself.
+    """
+    try:
+        with open(db_path + POINTER_SUFFIX, 'r') as f:
+            target = f.read().strip()
+    except FileNotFoundError:
+        return os.path.realpath(db_path)
+    return os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(db_path)), target))
+
+
+def generation_key(db_path):
+    """
+    Identify the data db_path currently holds, for keying caches derived from it: the
+    resolved generation path and that file's modification time. Generation paths are
+    never reused, and the modification time covers databases not published as generations.
+    """
+    path = resolve_generation(db_path)
+    return {'source': path, 'source_mtime': os.path.getmtime(path)}
+
+
+def publish_generation(build_path, db_path):
+    """
+    Atomically point db_path at a finished generation (a database file or a model
+    directory), mark the generation it replaces as retired, and prune old generations.
+    The symlink is created under a temporary name and renamed over db_path, so a reader
+    resolving db_path sees either the old generation or the new one, never neither.
+    Where symlinks cannot be created, a pointer file is renamed into place the same way.
+    """
+    previous = resolve_generation(db_path)
+    target = os.path.relpath(build_path, os.path.dirname(os.path.abspath(db_path)))
+    tmp_link = db_path + '.tmp'
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    try:
+        os.symlink(target, tmp_link)
+    except (OSError, NotImplementedError):
+        with open(tmp_link, 'w') as f:
+            f.write(target)
+        os.replace(tmp_link, db_path + POINTER_SUFFIX)
+    else:
+        os.replace(tmp_link, db_path)
+        if os.path.exists(db_path + POINTER_SUFFIX):
+            os.remove(db_path + POINTER_SUFFIX)
+
+    # The grace period of the replaced generation runs from now
+    if previous != os.path.realpath(build_path) and os.path.dirname(previous) == os.path.realpath(generations_dir_for(db_path)):
+        os.utime(previous)
+    prune_generations(db_path)
+
+
+def prune_generations(db_path, grace_seconds=GENERATION_GRACE_SECONDS):
+    """
+    Remove the generations of a database that were replaced (or abandoned) more than
+    grace_seconds ago, never the live one.
+    On POSIX systems readers that already have a removed generation open keep reading it;
+    where open files cannot be removed, the generation is skipped and retried on the next prune.
+    """
+    generations_dir = generations_dir_for(db_path)
+    live = resolve_generation(db_path)
+    cutoff = time.time() - grace_seconds
+    name, extension = os.path.splitext(os.path.basename(db_path))
+    for filename in sorted(os.listdir(generations_dir)):
+        if not (filename.startswith(name + '.') and filename.endswith(extension)):
+            continue
+        path = os.path.join(generations_dir, filename)
+        if os.path.realpath(path) == live or os.path.getmtime(path) > cutoff:
+            continue
+        try:
+            remove_generation(path)
+        except OSError:
+            pass
+
+
+def remove_generation(path):
+    """
+    Remove a generation: a model directory, or a database file with its -wal and -shm files.
+    """
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        remove_database_files(path)
+
+
+def remove_database_files(path):
+    """
+    Remove a database file together with its -wal and -shm files.
+    """
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def connect_readonly(db_path):
+    """
+    Open a read-only connection on the generation db_path currently points to.
+    The path is resolved once here, so the connection stays on that generation even if
+    the loader publishes a new one while it is open.
+    """
+    return sqlite3.connect(Path(resolve_generation(db_path)).as_uri() + '?mode=ro', uri=True)
@@ -0,0 +1,319 @@
+# scripts/movie_recommender.py
+
+"""
+Single entry point for the movie recommender.
+
+    python scripts/movie_recommender.py {load,snapshot,train,tune,search,recommend,batch,serve,bench} ...
+
+Heavy libraries (pandas, Surprise, scikit-learn) are only imported by the subcommands that
+build models. The serving subcommands (recommend, batch, serve) work from the published
+model arrays and need only NumPy, so they start quickly.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Path to your SQLite database
+DB_PATH = os.path.join(SCRIPTS_DIR, '..', 'data', 'movies.db')
+
+# Modules that must not be imported on the serving path
+HEAVY_MODULES = ('pandas', 'surprise', 'sklearn')
+
+# Module sets whose cold import time is checked by `bench`, and their time budgets in seconds
+STARTUP_CHECKS = {
+    'cli': (('movie_recommender',), 0.5),
+    'serving': (('model_store', 'request_batcher'), 1.0),
+}
+
+
+def load_serving_model(method, shards=0, quantized=False, profile_cache_mb=0):
+    """
+    Attach the published model for the given method and return it with its batch scorer and
+    a function adding new ratings, or None where new ratings would be ignored.
+    With shards > 0 the catalog is scored by that many shard worker processes; with quantized
+    set (collab only), candidates are selected from the model's quantized factors and re-ranked exactly.
+    Content methods cache user profiles in up to profile_cache_mb megabytes (per shard).
+    """
+    import functools
+    import model_store
+
+    model_dir = model_store.METHOD_MODEL_DIRS[method]
+    if quantized:
+        import quantized_scoring
+
+        if method not in quantized_scoring.QUANTIZED_ARRAYS:
+            print("Error: quantized scoring is only available for the collab method")
+            sys.exit(2)
+        if not quantized_scoring.has_quantized_arrays(model_store.load_arrays(model_dir), method):
+            print(f"Error: the {method} model has no quantized arrays; run `train --quantize int8` first")
+            sys.exit(2)
+
+    profile_cache_bytes = int(profile_cache_mb * 1024 * 1024)
+    if shards > 0:
+        import atexit
+        import sharded_scoring
+
+        scorer = sharded_scoring.ShardedScorer(model_dir, method, shards, quantized, profile_cache_bytes)
+        atexit.register(scorer.close)
+        add_rating = scorer.add_rating if method in ('content', 'profile') and profile_cache_bytes > 0 else None
+        return scorer.model, scorer.recommend_batch, add_rating
+
+    model = model_store.load_arrays(model_dir)
+    profile_cache = None
+    if method in ('content', 'profile') and profile_cache_bytes > 0:
+        from profile_cache import ProfileCache
+        profile_cache = ProfileCache(model, method, profile_cache_bytes)
+    recommend_batch = functools.partial(
+        model_store.recommend_batch, model, method, quantized=quantized, profile_cache=profile_cache
+    )
+    return model, recommend_batch, profile_cache.add_rating if profile_cache is not None else None
+
+
+def command_load(args):
+    import load_movie_data
+    load_movie_data.main(args.db)
+
+
+def command_snapshot(args):
+    import snapshot
+
+    snapshot.export_snapshot(args.db)
+    print(f"Snapshot written to {snapshot.snapshot_dir_for(args.db)}")
+
+
+def command_train(args):
+    import model_store
+
+    if args.method in ('collab', 'both'):
+        print("Training collaborative filtering model...")
+        model_store.publish_collab_model(args.db, half_life_days=args.half_life, quantize=args.quantize)
+        print(f"Published collaborative filtering model to {model_store.COLLAB_MODEL_DIR}")
+    if args.method in ('content', 'both'):
+        print("Building content-based features...")
+        model_store.publish_content_model(args.db, include_overview=args.overview, half_life_days=args.half_life)
+        print(f"Published content-based model to {model_store.CONTENT_MODEL_DIR}")
+    if args.quantize and args.method in ('collab', 'both'):
+        print(f"Published {args.quantize} quantized item factors with the collaborative filtering model")
+
+
+def command_tune(args):
+    import tune_svd
+
+    results = tune_svd.run_search(args.db, args.search, args.trials, args.budget, args.workers,
+                                  half_life_days=args.half_life)
+    if not results:
+        print("No configuration finished within the budget.")
+        return
+    tune_svd.write_results(results)
+    print(f"Best configuration saved to {tune_svd.SVD_PARAMS_PATH}")
+
+
+def command_search(args):
+    import movie_search
+    from movie_db import connect_readonly
+
+    conn = connect_readonly(args.db)
+    for movie_id in movie_search.search_movies(conn, ' '.join(args.text), limit=args.n):
+        title = conn.execute("SELECT original_title FROM movie WHERE movie_id = ?", (movie_id,)).fetchone()[0]
+        print(f"{movie_id}\t{title}")
+    conn.close()
+
+
+def filter_mask_from_args(model, args):
+    """
+    Build the filter mask for the constraints given on the command line, or None if there are none.
+    """
+    import model_store
+
+    try:
+        return model_store.build_filter_mask(
+            model, genres=args.genre, min_year=args.min_year, max_year=args.max_year,
+            languages=args.language, certificates=args.certificate,
+            min_runtime=args.min_runtime, max_runtime=args.max_runtime
+        )
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(2)
+
+
+def command_recommend(args):
+    import model_store
+
+    model, recommend_batch, _ = load_serving_model(args.method, args.shards, args.quantized, args.profile_cache_mb)
+    mask = filter_mask_from_args(model, args)
+    recommendations = recommend_batch([args.user_id], [args.n], [mask])[0]
+    if not recommendations:
+        print(f"No recommendations available for user {args.user_id}.")
+        return
+
+    score_key = model_store.SCORE_KEYS[args.method]
+    for idx, movie in enumerate(recommendations, start=1):
+        print(f"{idx}. {movie['title']} ({movie[score_key]:.4f})")
+
+
+def command_batch(args):
+    import model_store
+
+    model, recommend_batch, _ = load_serving_model(args.method, args.shards, args.quantized, args.profile_cache_mb)
+    mask = filter_mask_from_args(model, args)
+    score_key = model_store.SCORE_KEYS[args.method]
+
+    input_stream = open(args.input) if args.input else sys.stdin
+    user_ids = [int(line) for line in input_stream if line.strip().isdigit()]
+    if args.input:
+        input_stream.close()
+
+    # Score users chunk by chunk so each chunk is one matrix-matrix product
+    for start in range(0, len(user_ids), args.chunk_size):
+        chunk = user_ids[start:start + args.chunk_size]
+        for user_id, recommendations in zip(chunk, recommend_batch(chunk, [args.n] * len(chunk), [mask] * len(chunk))):
+            for movie in recommendations:
+                print(f"{user_id}\t{movie['movie_id']}\t{movie[score_key]:.4f}")
+
+
+def command_serve(args):
+    import asyncio
+    import request_batcher
+
+    model, recommend_batch, add_rating = load_serving_model(args.method, args.shards, args.quantized,
+                                                            args.profile_cache_mb)
+    mask = filter_mask_from_args(model, args)
+    asyncio.run(request_batcher.serve_lines(recommend_batch, args.n, mask=mask, add_rating=add_rating))
+
+
+def measure_startup(modules):
+    """
+    Import the given modules in a fresh interpreter.
+    Returns the import time in seconds and which heavy modules got pulled in.
+    """
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {', '.join(modules)}\n"
+        "print(time.perf_counter() - start)\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=SCRIPTS_DIR, capture_output=True, text=True, check=True
+    ).stdout.splitlines()
+    heavy = output[1].split(',') if len(output) > 1 and output[1] else []
+    return float(output[0]), heavy
+
+
+def check_startup():
+    """
+    Check that startup stays fast and the serving path stays free of heavy imports.
+    Returns True if every check passed.
+    """
+    passed = True
+    for name, (modules, budget) in STARTUP_CHECKS.items():
+        seconds, heavy = measure_startup(modules)
+        ok = seconds <= budget and not heavy
+        passed = passed and ok
+        status = 'ok' if ok else 'FAIL'
+        heavy_note = f", imports {', '.join(heavy)}" if heavy else ''
+        print(f"{name:<8} import {seconds * 1000:7.1f} ms (budget {budget * 1000:.0f} ms{heavy_note}) {status}")
+    return passed
+
+
+def command_bench(args):
+    print("Startup:")
+    passed = check_startup()
+
+    if not args.imports_only:
+        import asyncio
+        import model_store
+        import quantized_scoring
+        import request_batcher
+
+        print("\nScoring:")
+        model = model_store.load_arrays(model_store.COLLAB_MODEL_DIR)
+        asyncio.run(request_batcher.run_benchmark(model, list(model['rating_user_ids'])))
+
+        if quantized_scoring.has_quantized_arrays(model, 'collab'):
+            print("\nQuantized collab scoring:")
+            quantized_scoring.run_benchmark(model, list(model['rating_user_ids']))
+
+    if not passed:
+        sys.exit(1)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='movie-recommender', description="Movie recommender command line.")
+    parser.add_argument('--db', default=DB_PATH, help="Path to the SQLite database")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('load', help="Load the movie datasets into the database").set_defaults(func=command_load)
+
+    subparsers.add_parser(
+        'snapshot', help="Export the database to a columnar snapshot for fast training loads"
+    ).set_defaults(func=command_snapshot)
+
+    train = subparsers.add_parser('train', help="Train and publish the models")
+    train.add_argument('--method', choices=['collab', 'content', 'both'], default='both')
+    train.add_argument('--overview', action='store_true', help="Include overview text features")
+    train.add_argument('--quantize', choices=['int8', 'float16'], help="Also publish quantized item factors for the collab model")
+    train.add_argument('--half-life', type=float, metavar='DAYS',
+                       help="Weight ratings by time decay with this half-life in days")
+    train.set_defaults(func=command_train)
+
+    tune = subparsers.add_parser('tune', help="Tune the SVD hyperparameters")
+    tune.add_argument('--search', choices=['grid', 'random'], default='random')
+    tune.add_argument('--trials', type=int, default=12)
+    tune.add_argument('--budget', type=float, default=600, help="Wall-clock budget in seconds")
+    tune.add_argument('--workers', type=int, default=None)
+    tune.add_argument('--half-life', type=float, metavar='DAYS',
+                      help="Tune for ratings weighted by time decay with this half-life in days")
+    tune.set_defaults(func=command_tune)
+
+    search = subparsers.add_parser('search', help="Find movies by title or overview text")
+    search.add_argument('text', nargs='+')
+    search.add_argument('-n', type=int, default=10)
+    search.set_defaults(func=command_search)
+
+    for name, func, help_text in (
+        ('recommend', command_recommend, "Recommend movies for one user"),
+        ('batch', command_batch, "Recommend movies for a list of user ids"),
+        ('serve', command_serve,
+         "Serve recommendations for user ids read line by line from stdin; "
+         "'rate <user_id> <movie_id> <rating>' lines add ratings"),
+    ):
+        serving = subparsers.add_parser(name, help=help_text)
+        serving.add_argument('--method', choices=['collab', 'content', 'profile'], default='collab')
+        serving.add_argument('-n', type=int, default=10, help="Number of recommendations per user")
+        serving.add_argument('--shards', type=int, default=0, help="Score the catalog across this many worker processes")
+        serving.add_argument('--quantized', action='store_true', help="Select candidates from the quantized item factors (collab only)")
+        serving.add_argument('--profile-cache-mb', type=float, default=64,
+                             help="Memory cap for cached content profiles (0 disables the cache)")
+        serving.add_argument('--genre', action='append', default=[], help="Require a genre (repeatable)")
+        serving.add_argument('--language', action='append', default=[], help="Allow an original language code")
+        serving.add_argument('--certificate', action='append', default=[], help="Allow a certificate")
+        serving.add_argument('--min-year', type=int)
+        serving.add_argument('--max-year', type=int)
+        serving.add_argument('--min-runtime', type=int, help="Minimum runtime in minutes")
+        serving.add_argument('--max-runtime', type=int, help="Maximum runtime in minutes")
+        serving.set_defaults(func=func)
+        if name == 'recommend':
+            serving.add_argument('user_id', type=int)
+        elif name == 'batch':
+            serving.add_argument('--input', help="File of user ids, one per line (default: stdin)")
+            serving.add_argument('--chunk-size', type=int, default=256)
+
+    bench = subparsers.add_parser('bench', help="Benchmark startup time and scoring throughput")
+    bench.add_argument('--imports-only', action='store_true', help="Only run the startup checks")
+    bench.set_defaults(func=command_bench)
+
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -20,6 +20,7 @@ DROP TABLE IF EXISTS director;
 DROP TABLE IF EXISTS genre;
 DROP TABLE IF EXISTS country;
 DROP TABLE IF EXISTS language;
+DROP TABLE IF EXISTS load_reject;
 
 -- Drop indexes if they exist
 DROP INDEX IF EXISTS idx_movie_title;
@@ -36,6 +37,12 @@ DROP VIEW IF EXISTS movies_and_genres;
 DROP VIEW IF EXISTS user_activity_summary;
 DROP VIEW IF EXISTS top_rated_movies;
 
+-- Drop full-text search index and its sync triggers if they exist
+DROP TRIGGER IF EXISTS movie_fts_insert;
+DROP TRIGGER IF EXISTS movie_fts_delete;
+DROP TRIGGER IF EXISTS movie_fts_update;
+DROP TABLE IF EXISTS movie_fts;
+
 
 PRAGMA foreign_keys = ON;
 
@@ -96,7 +103,7 @@ CREATE TABLE person (
 -- Table: movie
 
 CREATE TABLE movie (
-    movie_id INT PRIMARY KEY,
+    movie_id INTEGER PRIMARY KEY,  -- INTEGER, not INT, so movie_id is the rowid that movie_fts keys on
     original_language_code VARCHAR(10),
     original_title VARCHAR(255) NOT NULL,
     english_title VARCHAR(255),
@@ -180,13 +187,27 @@ CREATE TABLE movie_director (
 CREATE TABLE rating (
     user_id INT,
     movie_id INT,
-    rating REAL CHECK (rating >= 0.5 AND rating <= 5.0 AND (rating * 2) % 1 = 0),
+    -- Half-star steps; SQLite's % truncates reals, so compare with the truncated value instead
+    rating REAL CHECK (rating >= 0.5 AND rating <= 5.0 AND rating * 2 = CAST(rating * 2 AS INTEGER)),
     rating_date DATE,
     PRIMARY KEY (user_id, movie_id),
     FOREIGN KEY (user_id) REFERENCES user(user_id),
     FOREIGN KEY (movie_id) REFERENCES movie(movie_id)
 );
 
+-- Table: load_reject (Source rows the loader rejected, with the reason)
+-- The loader stages each source file in unconstrained temporary tables, validates the staged rows
+-- with set-based statements and merges the valid ones; every other row is recorded here with the
+-- first rule it failed and its raw values as a JSON object, so a load can be audited afterwards.
+-- Ratings loaded without a date that did not parse are recorded here as well, with their raw date.
+
+CREATE TABLE load_reject (
+    source VARCHAR(50) NOT NULL,
+    record_number INT NOT NULL,
+    reason VARCHAR(255) NOT NULL,
+    record TEXT
+);
+
 -- Indexes for Optimizing Joins and Query Performance
 -- These indexes are chosen to improve the efficiency of joins across the schema, especially for tables
 -- involved in foreign key relationships and many-to-many associations. They target the most common
@@ -216,6 +237,41 @@ CREATE INDEX idx_person_name ON person (name);
 -- Index for filtering movies by original language
 CREATE INDEX idx_movie_language ON movie (original_language_code);
 
+-- Full-text search index over movie titles and overviews
+-- idx_movie_title only serves exact/prefix matches on original_title, so looking up the movie a user
+-- means by free text would otherwise scan the whole movie table. movie_fts is an external-content FTS5
+-- table: it stores only the inverted index and reads the text back from movie, keyed by movie_id.
+-- The loader suspends the sync triggers below while it bulk-inserts movies, populates the index with a
+-- single 'rebuild' once all movies are present, and then restores the triggers (see movie_search).
+CREATE VIRTUAL TABLE movie_fts USING fts5(
+    original_title,
+    english_title,
+    overview,
+    content='movie',
+    content_rowid='movie_id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+-- Triggers that keep the external-content FTS index in sync with the movie table.
+-- An external-content index must be told the old column values on delete/update,
+-- which is why the 'delete' command rows carry old.* values.
+CREATE TRIGGER movie_fts_insert AFTER INSERT ON movie BEGIN
+    INSERT INTO movie_fts (rowid, original_title, english_title, overview)
+    VALUES (new.movie_id, new.original_title, new.english_title, new.overview);
+END;
+
+CREATE TRIGGER movie_fts_delete AFTER DELETE ON movie BEGIN
+    INSERT INTO movie_fts (movie_fts, rowid, original_title, english_title, overview)
+    VALUES ('delete', old.movie_id, old.original_title, old.english_title, old.overview);
+END;
+
+CREATE TRIGGER movie_fts_update AFTER UPDATE ON movie BEGIN
+    INSERT INTO movie_fts (movie_fts, rowid, original_title, english_title, overview)
+    VALUES ('delete', old.movie_id, old.original_title, old.english_title, old.overview);
+    INSERT INTO movie_fts (rowid, original_title, english_title, overview)
+    VALUES (new.movie_id, new.original_title, new.english_title, new.overview);
+END;
+
 
 
 -- View: Movies and their associated genres
@@ -0,0 +1,131 @@
+# scripts/movie_search.py
+
+"""
+Full-text movie search backed by the SQLite FTS5 index defined in movie_schema.sql.
+Looks up movies by free text over their original title, English title and overview,
+returning movie_ids ranked by relevance.
+"""
+
+import os
+import re
+import sys
+
+from movie_db import connect_readonly
+
+# Relative weights for the bm25() ranking function, one per movie_fts column
+# (original_title, english_title, overview). A title hit counts far more than an overview hit.
+BM25_WEIGHTS = (10.0, 10.0, 1.0)
+
+
+def drop_search_triggers(conn):
+    """
+    Drop the movie_fts sync triggers defined in movie_schema.sql, returning their SQL so
+    create_search_triggers can restore them. Used to suspend per-row indexing during bulk loads.
+    """
+    triggers = conn.execute("""
+    SELECT name, sql FROM sqlite_master
+    WHERE type = 'trigger' AND tbl_name = 'movie' AND name LIKE 'movie_fts_%'
+    ORDER BY name;
+    """).fetchall()
+    for name, _ in triggers:
+        conn.execute(f"DROP TRIGGER {name};")
+    return [sql for _, sql in triggers]
+
+
+def create_search_triggers(conn, trigger_sql):
+    """
+    Recreate sync triggers returned by drop_search_triggers.
+    """
+    for sql in trigger_sql:
+        conn.execute(sql)
+    conn.commit()
+
+
+def rebuild_search_index(conn):
+    """
+    Populate the full-text search index from the movie table in a single bulk pass.
+    The sync triggers are left alone: they only fire on changes to movie, which this does
+    not make. Bulk loads suspend them separately (see drop_search_triggers).
+    """
+    # 'rebuild' discards the index and re-reads every row of the content table;
+    # 'optimize' then merges the resulting b-tree segments into one for faster queries
+    cur = conn.cursor()
+    cur.execute("INSERT INTO movie_fts (movie_fts) VALUES ('rebuild');")
+    cur.execute("INSERT INTO movie_fts (movie_fts) VALUES ('optimize');")
+    conn.commit()
+
+
+def build_match_query(text):
+    """
+    Turn free text into an FTS5 MATCH expression.
+    Each word is quoted so user input cannot inject FTS5 query syntax, and the last word
+    is matched as a prefix so partially typed titles still find their movie.
+    Returns None if the text contains no searchable words.
+    """
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_movies(conn, text, limit=10):
+    """
+    Search movie titles and overviews, returning up to `limit` movie_ids ordered by relevance.
+    """
+    match_query = build_match_query(text)
+    if match_query is None:
+        return []
+
+    cur = conn.cursor()
+    cur.execute(f"""
+    SELECT rowid
+    FROM movie_fts
+    WHERE movie_fts MATCH ?
+    ORDER BY bm25(movie_fts, {', '.join(str(w) for w in BM25_WEIGHTS)})
+    LIMIT ?;
+    """, (match_query, limit))
+    return [row[0] for row in cur.fetchall()]
+
+
+def find_movie_id(conn, title):
+    """
+    Resolve the movie a user means by title to a single movie_id, or None if nothing matches.
+    """
+    movie_ids = search_movies(conn, title, limit=1)
+    return movie_ids[0] if movie_ids else None
+
+
+def main():
+    # Path to your SQLite database
+    db_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'movies.db')
+
+    if len(sys.argv) > 1:
+        text = ' '.join(sys.argv[1:])
+    else:
+        text = input("Enter a movie title or description to search for: ")
+
+    conn = connect_readonly(db_path)
+    movie_ids = search_movies(conn, text)
+
+    if not movie_ids:
+        print(f"\nNo movies found matching '{text}'.")
+        conn.close()
+        return
+
+    print(f"\nMovies matching '{text}':")
+    cur = conn.cursor()
+    for idx, movie_id in enumerate(movie_ids, start=1):
+        cur.execute("SELECT original_title, english_title FROM movie WHERE movie_id = ?", (movie_id,))
+        original_title, english_title = cur.fetchone()
+        if english_title and english_title != original_title:
+            print(f"{idx}. {original_title} ({english_title}) [ID: {movie_id}]")
+        else:
+            print(f"{idx}. {original_title} [ID: {movie_id}]")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+# scripts/profile_cache.py
+
+"""
+Cache of per-user content profiles for serving.
+Building a content profile means gathering the user's ratings and summing their feature
+rows. For active users that work is the same on every request, so profiles are kept in an
+LRU cache keyed by user_id, bounded by a memory cap. A new rating updates the cached profile
+in place, adding one weighted feature row instead of rebuilding it from every rating.
+For a model published with time-decayed ratings, new ratings are weighted against the cache's
+reference day. A rating dated after it moves the reference day forward, and every cached weight
+is rebased with one decay_factor; profiles are normalised, so they stay valid as the clock advances.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+from model_store import (
+    CONTENT_MODEL_DIR, SCORE_KEYS, load_arrays, lookup_rows, sparse_from_arrays, batch_rated_items,
+    profile_weights, content_profiles_batch, recommend_batch, rating_days, decay_weights, advance_decay_weights
+)
+
+# Default memory cap for cached profiles
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Approximate fixed cost of one cache entry (dict, arrays and their headers), counted against the cap
+ENTRY_OVERHEAD_BYTES = 512
+
+# Approximate cost of one rating added since publishing (dict slot, tuple and floats), counted against the cap
+NEW_RATING_BYTES = 160
+
+
+def entry_bytes(entry):
+    """
+    Approximate memory used by one cache entry.
+    """
+    arrays = ('profile_indices', 'profile_data', 'rated_items', 'rated_values', 'rated_weights')
+    return ENTRY_OVERHEAD_BYTES + sum(entry[name].nbytes for name in arrays)
+
+
+class ProfileCache:
+    """
+    LRU cache of content profiles for one published content model and weighting
+    ('content' or 'profile', see model_store.profile_weights).
+    Each entry holds a user's normalised profile as sparse indices and values, the profile's
+    total absolute weight, and the positions, values and time-decay weights of the movies the user has rated,
+    which both exclude those movies from recommendations and let a new rating replace an
+    earlier one. Ratings added since the model was published are kept separately, so an
+    evicted profile is rebuilt with them; they count against the memory cap too, and once
+    profiles alone cannot make room, the ratings of the users who rated least recently are
+    dropped. The cache is an overlay until the next publish, not a store: persist ratings
+    elsewhere. Safe to share between scoring threads.
+    """
+
+    def __init__(self, model, weighting='content', max_bytes=DEFAULT_MAX_BYTES):
+        self.model = model
+        self.weighting = weighting
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        # user_id -> {movie position: (rating, decay weight)} for ratings added after the model was
+        # published, least recently rated user first
+        self.new_ratings = OrderedDict()
+        # user_id -> stamp of the user's latest added rating, from a counter that never repeats,
+        # so a profile built from older ratings is not cached over a newer update
+        self.versions = {}
+        self.rating_clock = 0
+        # Day that decay weights in the cache are relative to, from the model until a newer rating arrives
+        self.half_life_days = None
+        self.reference_day = None
+        if 'rating_half_life_days' in model:
+            self.half_life_days = float(model['rating_half_life_days'])
+            self.reference_day = float(model['rating_reference_day'])
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dropped_ratings = 0
+
+    def profiles_batch(self, user_ids):
+        """
+        Get the profiles of a batch of users, building and caching any that are missing.
+        Returns the same values as model_store.batch_profiles: the sparse profiles, a mask of
+        users with a non-empty profile, and the batch rows and positions of their rated movies.
+        """
+        import scipy.sparse as sp
+
+        with self.lock:
+            entries = [self.entries.get(user_id) for user_id in user_ids]
+            for user_id, entry in zip(user_ids, entries):
+                if entry is not None:
+                    self.entries.move_to_end(user_id)
+            missing = list(dict.fromkeys(user_id for user_id, entry in zip(user_ids, entries) if entry is None))
+            misses = sum(entry is None for entry in entries)
+            self.hits += len(user_ids) - misses
+            self.misses += misses
+            # Snapshot the added ratings the missing profiles are built from, and their versions
+            versions = [self.versions.get(user_id, 0) for user_id in missing]
+            new_ratings = [dict(self.new_ratings.get(user_id, {})) for user_id in missing]
+            reference_day = self.reference_day
+
+        # Build missing profiles outside the lock so other threads can keep hitting the cache
+        if missing:
+            built = dict(zip(missing, self.build_entries(missing, new_ratings, reference_day)))
+            with self.lock:
+                for (user_id, entry), version in zip(built.items(), versions):
+                    # A rating added meanwhile is not in this entry; leave it to the next miss
+                    if self.versions.get(user_id, 0) == version:
+                        if self.reference_day != reference_day:
+                            entry = self.rebase_entry(entry, reference_day)
+                        self.store(user_id, entry)
+            entries = [entry if entry is not None else built[user_id] for user_id, entry in zip(user_ids, entries)]
+
+        n_features = int(self.model['features_shape'][1])
+        lengths = np.array([len(entry['profile_indices']) for entry in entries], dtype=np.int64)
+        profiles = sp.csr_matrix(
+            (
+                np.concatenate([entry['profile_data'] for entry in entries]),
+                np.concatenate([entry['profile_indices'] for entry in entries]),
+                np.concatenate([[0], np.cumsum(lengths)]),
+            ),
+            shape=(len(entries), n_features)
+        )
+        has_profile = np.array([entry['total'] > 0 for entry in entries], dtype=bool)
+        rated_counts = [len(entry['rated_items']) for entry in entries]
+        rated_rows = np.repeat(np.arange(len(entries)), rated_counts)
+        rated_items = np.concatenate([entry['rated_items'] for entry in entries])
+        return profiles, has_profile, rated_rows, rated_items
+
+    def build_entries(self, user_ids, new_ratings, reference_day=None):
+        """
+        Build cache entries from the model's ratings plus each user's added ratings
+        (a {movie position: (rating, decay weight)} dict per user), in one batch.
+        Decay weights are rebased from the model's reference day onto reference_day.
+        """
+        rated_rows, rated_items, rated_values, rated_weights = batch_rated_items(self.model, user_ids)
+        if reference_day is not None and reference_day != float(self.model['rating_reference_day']):
+            rated_weights = advance_decay_weights(rated_weights, float(self.model['rating_reference_day']),
+                                                  reference_day, self.half_life_days)
+
+        new_rows, new_items, new_values, new_weights = [], [], [], []
+        for row, user_ratings in enumerate(new_ratings):
+            for position, (rating, weight) in user_ratings.items():
+                new_rows.append(row)
+                new_items.append(position)
+                new_values.append(rating)
+                new_weights.append(weight)
+        if new_rows:
+            # A new rating replaces the published rating of the same movie
+            n_movies = len(self.model['movie_ids'])
+            replaced = np.isin(rated_rows * n_movies + rated_items,
+                               np.array(new_rows) * n_movies + np.array(new_items))
+            order = np.argsort(np.concatenate([rated_rows[~replaced], new_rows]), kind='stable')
+            rated_rows = np.concatenate([rated_rows[~replaced], new_rows])[order]
+            rated_items = np.concatenate([rated_items[~replaced], new_items]).astype(np.int32)[order]
+            rated_values = np.concatenate([rated_values[~replaced], new_values]).astype(np.float32)[order]
+            rated_weights = np.concatenate([rated_weights[~replaced], new_weights]).astype(np.float32)[order]
+
+        profiles, totals = content_profiles_batch(self.model, len(user_ids), rated_rows, rated_items,
+                                                  rated_values, self.weighting, rated_weights)
+        bounds = np.searchsorted(rated_rows, np.arange(len(user_ids) + 1))
+        return [
+            {
+                'profile_indices': profiles.indices[profiles.indptr[row]:profiles.indptr[row + 1]].copy(),
+                'profile_data': profiles.data[profiles.indptr[row]:profiles.indptr[row + 1]].copy(),
+                'total': float(totals[row]),
+                'rated_items': rated_items[bounds[row]:bounds[row + 1]].copy(),
+                'rated_values': rated_values[bounds[row]:bounds[row + 1]].copy(),
+                'rated_weights': rated_weights[bounds[row]:bounds[row + 1]].copy(),
+            }
+            for row in range(len(user_ids))
+        ]
+
+    def store(self, user_id, entry):
+        """
+        Insert or replace a user's entry, then shrink the cache down to the cap.
+        Must be called with the lock held.
+        """
+        if user_id in self.entries:
+            self.nbytes -= entry_bytes(self.entries.pop(user_id))
+        self.entries[user_id] = entry
+        self.nbytes += entry_bytes(entry)
+        self.shrink()
+
+    def shrink(self):
+        """
+        Evict least recently used profiles until the cache fits its cap; if added ratings
+        alone exceed it, drop the ratings (and any profile) of the least recently rating users.
+        Must be called with the lock held.
+        """
+        while self.nbytes > self.max_bytes and self.entries:
+            _, evicted = self.entries.popitem(last=False)
+            self.nbytes -= entry_bytes(evicted)
+            self.evictions += 1
+        while self.nbytes > self.max_bytes and self.new_ratings:
+            user_id, dropped = self.new_ratings.popitem(last=False)
+            self.nbytes -= NEW_RATING_BYTES * len(dropped)
+            self.dropped_ratings += len(dropped)
+            del self.versions[user_id]
+
+    def rebase_entry(self, entry, from_day):
+        """
+        Return an entry whose decay weights were computed against from_day, rebased onto the
+        cache's reference day. The normalised profile is unchanged; only the weights and their
+        total shrink.
+        """
+        rated_weights = advance_decay_weights(entry['rated_weights'], from_day, self.reference_day,
+                                              self.half_life_days)
+        total = float(np.abs(profile_weights(entry['rated_values'], self.weighting) * rated_weights).sum())
+        return {**entry, 'rated_weights': rated_weights, 'total': total}
+
+    def advance_reference_day(self, day):
+        """
+        Move the reference day forward to day, rebasing every cached entry and added rating
+        with one decay factor, so weights stay finite however far the clock advances.
+        Must be called with the lock held.
+        """
+        from_day, self.reference_day = self.reference_day, day
+        for user_id, entry in self.entries.items():
+            self.entries[user_id] = self.rebase_entry(entry, from_day)
+        for user_ratings in self.new_ratings.values():
+            positions = list(user_ratings)
+            weights = advance_decay_weights([user_ratings[position][1] for position in positions], from_day, day,
+                                            self.half_life_days)
+            for position, weight in zip(positions, weights):
+                user_ratings[position] = (user_ratings[position][0], float(weight))
+
+    def rating_weight(self, rating_date=None):
+        """
+        Time-decay weight of a new rating made on rating_date (default today) against the
+        cache's reference day, moving that day forward first if the rating is newer;
+        1 for a model published without decay.
+        Must be called with the lock held.
+        """
+        if self.half_life_days is None:
+            return 1.0
+        day = float(rating_days([np.datetime64('today') if rating_date is None else rating_date])[0])
+        if day > self.reference_day:
+            self.advance_reference_day(day)
+        weights, _ = decay_weights([day], self.half_life_days, self.reference_day)
+        return float(weights[0])
+
+    def add_rating(self, user_id, movie_id, rating, rating_date=None):
+        """
+        Record a new rating, made on rating_date (default today). A cached profile is updated
+        incrementally: the rated movie's feature row is added with its weight (replacing the
+        user's earlier rating of the movie, if any) and the profile is renormalised by the new
+        total weight.
+        Raises ValueError for a movie that is not in the model.
+        """
+        import scipy.sparse as sp
+
+        rows, known = lookup_rows(self.model['movie_ids'], [movie_id])
+        if not known[0]:
+            raise ValueError(f"Unknown movie_id: {movie_id}")
+        position = int(rows[0])
+
+        with self.lock:
+            decay = self.rating_weight(rating_date)
+            user_ratings = self.new_ratings.setdefault(user_id, {})
+            self.new_ratings.move_to_end(user_id)
+            if position not in user_ratings:
+                self.nbytes += NEW_RATING_BYTES
+            user_ratings[position] = (float(rating), decay)
+            self.rating_clock += 1
+            self.versions[user_id] = self.rating_clock
+            entry = self.entries.get(user_id)
+            if entry is None:
+                self.shrink()
+                return
+
+            features = sparse_from_arrays(self.model, 'features')
+            previous = np.flatnonzero(entry['rated_items'] == position)
+            old_weight = float((profile_weights(entry['rated_values'][previous], self.weighting)
+                                * entry['rated_weights'][previous]).sum())
+            new_weight = float(profile_weights([rating], self.weighting)[0]) * decay
+            total = entry['total'] - abs(old_weight) + abs(new_weight)
+
+            n_features = features.shape[1]
+            profile = sp.csr_matrix(
+                (entry['profile_data'], entry['profile_indices'], [0, len(entry['profile_indices'])]),
+                shape=(1, n_features)
+            )
+            if total > 0:
+                profile = (profile * entry['total'] + features[position] * (new_weight - old_weight)) / total
+                profile = sp.csr_matrix(profile, dtype=np.float32)
+                profile.eliminate_zeros()
+            else:
+                profile = sp.csr_matrix((1, n_features), dtype=np.float32)
+
+            keep = entry['rated_items'] != position
+            self.store(user_id, {
+                'profile_indices': profile.indices.astype(np.int32),
+                'profile_data': profile.data,
+                'total': total,
+                'rated_items': np.append(entry['rated_items'][keep], np.int32(position)),
+                'rated_values': np.append(entry['rated_values'][keep], np.float32(rating)),
+                'rated_weights': np.append(entry['rated_weights'][keep], np.float32(decay)),
+            })
+
+    def stats(self):
+        """
+        Return hit, miss and eviction counts and the current size of the cache.
+        """
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.nbytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'new_ratings': sum(len(user_ratings) for user_ratings in self.new_ratings.values()),
+                'dropped_ratings': self.dropped_ratings,
+            }
+
+
+def main():
+    # Compare repeated content recommendations with and without the profile cache
+    weighting = sys.argv[1] if len(sys.argv) > 1 else 'content'
+    model = load_arrays(CONTENT_MODEL_DIR)
+    cache = ProfileCache(model, weighting)
+
+    user_ids = list(model['rating_user_ids'][:256])
+    ns = [10] * len(user_ids)
+    expected = recommend_batch(model, weighting, user_ids, ns)
+
+    for label, profile_cache in (('uncached', None), ('cold cache', cache), ('warm cache', cache)):
+        start = time.perf_counter()
+        results = recommend_batch(model, weighting, user_ids, ns, profile_cache=profile_cache)
+        elapsed = time.perf_counter() - start
+        status = 'identical' if results == expected else 'MISMATCH'
+        print(f"{label:<10}: {elapsed * 1000:.1f} ms, {status}")
+    print(f"Cache: {cache.stats()}")
+
+    # A new rating updates the cached profile incrementally
+    user_id, movie_id = user_ids[0], int(model['movie_ids'][0])
+    cache.add_rating(user_id, movie_id, 5.0)
+    updated = recommend_batch(model, weighting, [user_id], [10], profile_cache=cache)[0]
+    print(f"\nUser {user_id} after rating movie {movie_id} 5.0:")
+    for idx, movie in enumerate(updated, start=1):
+        print(f"{idx}. {movie['title']} ({movie[SCORE_KEYS[weighting]]:.4f})")
+
+
+if __name__ == "__main__":
+    main()
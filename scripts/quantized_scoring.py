@@ -0,0 +1,222 @@
+# scripts/quantized_scoring.py
+
+"""
+Quantized scoring for published collaborative filtering models.
+The item factors are stored a second time as int8 or float16 values with one float32 scale
+per row, an eighth or a quarter of the float64 originals. Candidates are selected by scanning
+the compact factors with a float32 kernel, then re-scored exactly from the full-precision
+factors, so returned scores match the unquantized path and only the few candidate rows of
+the large array are ever touched.
+The quantized factors are an extra copy, not a replacement: the published model grows by
+the compact array on disk, while scoring keeps only it and the candidate rows hot.
+Content feature rows are not quantized: their int32 column indices, which quantizing
+leaves as they are, make up most of each sparse row, and the sparse product upcasts the
+values to float32 anyway, so scanning them would save little and run slower.
+"""
+
+import sys
+import time
+import numpy as np
+
+from model_store import (
+    COLLAB_MODEL_DIR, SCORE_BLOCK_SIZE, SCORE_KEYS, RATING_SCALE, load_arrays, lookup_rows, batch_rated_items,
+    top_n_positions_batch, range_masks, score_top_n_batch, format_recommendations
+)
+
+# Storage types for quantized values
+QUANTIZED_DTYPES = {'int8': np.int8, 'float16': np.float16}
+
+# Largest magnitude of an int8 quantized value
+INT8_LIMIT = 127
+
+# Array quantized for each scoring method that supports quantized scoring
+QUANTIZED_ARRAYS = {'collab': 'item_factors'}
+
+# Candidates re-ranked exactly per user: RERANK_FACTOR times n, but at least MIN_RERANK_CANDIDATES
+RERANK_FACTOR = 4
+MIN_RERANK_CANDIDATES = 50
+
+
+def row_scales(row_max, dtype):
+    """
+    Per-row scales that map each row's largest magnitude onto the quantized range:
+    [-127, 127] for int8 and [-1, 1] for float16. All-zero rows get a scale of 1.
+    """
+    scale = np.where(row_max > 0, row_max, 1).astype(np.float32)
+    return scale / INT8_LIMIT if dtype == 'int8' else scale
+
+
+def quantize_values(values, scale, dtype):
+    """
+    Divide values by their row's scale and store them as the quantized type.
+    """
+    if dtype == 'int8':
+        return np.clip(np.rint(values / scale), -INT8_LIMIT, INT8_LIMIT).astype(QUANTIZED_DTYPES[dtype])
+    return (values / scale).astype(QUANTIZED_DTYPES[dtype])
+
+
+def quantize_rows(matrix, dtype):
+    """
+    Quantize a dense matrix with one scale per row. Returns the quantized matrix and the scales.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scale = row_scales(np.abs(matrix).max(axis=1, initial=0), dtype)
+    return quantize_values(matrix, scale[:, None], dtype), scale
+
+
+def quantize_arrays(model, dtype='int8'):
+    """
+    Quantize a collaborative filtering model's item factors. Returns the quantized factors and
+    their scales, keyed by the names they are published under; models without item factors
+    get no quantized arrays.
+    """
+    if 'item_factors' not in model:
+        return {}
+    quantized, scale = quantize_rows(model['item_factors'], dtype)
+    return {'item_factors_quantized': quantized, 'item_factors_scale': scale}
+
+
+def has_quantized_arrays(model, method):
+    """
+    Check whether a model carries the quantized arrays the given method scores with.
+    Methods without quantized scoring never do.
+    """
+    return method in QUANTIZED_ARRAYS and f"{QUANTIZED_ARRAYS[method]}_quantized" in model
+
+
+def approximate_collab_scores_batch(model, user_ids, start, end):
+    """
+    Approximate collaborative filtering scores of the movies at positions [start, end) from the
+    quantized item factors, in float32. Factors are dequantized one block at a time, so the
+    block stays in cache, and row scales are applied to the product rather than the factors.
+    Scores are clipped like the exact ones, so movies tied at the top of the scale are
+    selected by position, as the full-precision path breaks those ties.
+    """
+    rows, known = lookup_rows(model['user_ids'], user_ids)
+    scores = np.empty((len(rows), end - start), dtype=np.float32)
+    scores[:] = model['global_mean'] + model['item_biases'][start:end]
+    if known.any():
+        known_rows = rows[known]
+        user_factors = model['user_factors'][known_rows].astype(np.float32)
+        scores[known] += model['user_biases'][known_rows][:, None]
+
+        block_start = start
+        while block_start < end:
+            block_end = min((block_start // SCORE_BLOCK_SIZE + 1) * SCORE_BLOCK_SIZE, end)
+            block = model['item_factors_quantized'][block_start:block_end].astype(np.float32)
+            scores[known, block_start - start:block_end - start] += (
+                (user_factors @ block.T) * model['item_factors_scale'][block_start:block_end]
+            )
+            block_start = block_end
+    return np.clip(scores, *RATING_SCALE, out=scores)
+
+
+def exact_collab_scores(model, user_ids, batch_rows, positions):
+    """
+    Score (batch row, movie position) pairs from the full-precision factors, the same way
+    model_store.predict_collab_scores_batch does.
+    """
+    rows, known = lookup_rows(model['user_ids'], np.asarray(user_ids)[batch_rows])
+    scores = model['global_mean'] + model['item_biases'][positions]
+    if known.any():
+        known_rows, known_positions = rows[known], positions[known]
+        scores[known] += model['user_biases'][known_rows]
+        scores[known] += np.einsum(
+            'ij,ij->i', model['user_factors'][known_rows], model['item_factors'][known_positions]
+        )
+    return np.clip(scores, *RATING_SCALE, out=scores)
+
+
+def quantized_score_top_n_batch(model, method, user_ids, ns, masks=None, start=0, end=None):
+    """
+    Same contract as model_store.score_top_n_batch, scored in two passes: the quantized
+    factors select each user's candidates, which are then re-scored exactly and re-ranked.
+    """
+    if method not in QUANTIZED_ARRAYS:
+        raise ValueError(f"Quantized scoring is only available for {', '.join(QUANTIZED_ARRAYS)}, not {method}")
+    if not has_quantized_arrays(model, method):
+        raise ValueError(f"Model has no quantized {QUANTIZED_ARRAYS[method]}; publish it with quantize=")
+
+    end = len(model['movie_ids']) if end is None else end
+
+    rated_rows, rated_items, _, _ = batch_rated_items(model, user_ids)
+    scores = approximate_collab_scores_batch(model, user_ids, start, end)
+
+    in_range = (rated_items >= start) & (rated_items < end)
+    candidate_ns = [max(RERANK_FACTOR * n, MIN_RERANK_CANDIDATES) if n > 0 else 0 for n in ns]
+    candidates = top_n_positions_batch(scores, rated_rows[in_range], rated_items[in_range] - start,
+                                       candidate_ns, range_masks(masks, start, end))
+
+    # Re-score every user's candidates in one vectorised pass
+    counts = np.array([len(positions) for positions in candidates], dtype=np.int64)
+    batch_rows = np.repeat(np.arange(len(user_ids)), counts)
+    positions = np.concatenate(candidates).astype(np.int64) + start if candidates else np.empty(0, dtype=np.int64)
+    exact = exact_collab_scores(model, user_ids, batch_rows, positions)
+
+    results = []
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    for row, n in enumerate(ns):
+        user_positions = positions[offsets[row]:offsets[row + 1]]
+        user_scores = exact[offsets[row]:offsets[row + 1]]
+        order = np.lexsort((user_positions, -user_scores))[:n]
+        results.append((user_positions[order], user_scores[order]))
+    return results
+
+
+def array_bytes(model, names):
+    """
+    Total size in bytes of the named model arrays.
+    """
+    return sum(model[name].nbytes for name in names)
+
+
+def run_benchmark(model, user_ids, n=10, batch_size=256):
+    """
+    Compare quantized collaborative filtering scoring with full-precision scoring: size of
+    the scanned arrays, scoring time over all users, and the overlap of the top-n lists.
+    """
+    full_names = ['item_factors']
+    quantized_names = ['item_factors_quantized', 'item_factors_scale']
+    full_bytes, quantized_bytes = array_bytes(model, full_names), array_bytes(model, quantized_names)
+    print(f"Scanned arrays: {full_bytes / 1e6:.2f} MB full, {quantized_bytes / 1e6:.2f} MB quantized "
+          f"({model[quantized_names[0]].dtype}, {1 - quantized_bytes / full_bytes:.0%} smaller)")
+
+    timings = {}
+    top_n = {}
+    for quantized in (False, True):
+        start = time.perf_counter()
+        results = []
+        for batch_start in range(0, len(user_ids), batch_size):
+            batch = user_ids[batch_start:batch_start + batch_size]
+            results.extend(score_top_n_batch(model, 'collab', batch, [n] * len(batch), quantized=quantized))
+        timings[quantized] = time.perf_counter() - start
+        top_n[quantized] = results
+
+    overlaps = [
+        len(set(full.tolist()) & set(quantized.tolist())) / len(full)
+        for (full, _), (quantized, _) in zip(top_n[False], top_n[True]) if len(full)
+    ]
+    mean_overlap = float(np.mean(overlaps)) if overlaps else 1.0
+    print(f"Full precision: {timings[False] * 1000:.1f} ms, quantized: {timings[True] * 1000:.1f} ms "
+          f"(speed-up {timings[False] / timings[True]:.2f}x) for {len(user_ids)} users")
+    print(f"Top-{n} overlap with full precision: {mean_overlap:.1%}")
+    return top_n
+
+
+def main():
+    # Benchmark the published quantized model against full precision; publishing is left to
+    # `movie_recommender train --quantize`
+    model = load_arrays(COLLAB_MODEL_DIR)
+    if not has_quantized_arrays(model, 'collab'):
+        print("Error: the collab model has no quantized arrays; run `train --quantize int8` first")
+        sys.exit(2)
+    top_n = run_benchmark(model, list(model['rating_user_ids']))
+
+    # Show the first user's quantized recommendations
+    first = format_recommendations(model, top_n[True][:1], SCORE_KEYS['collab'])[0]
+    for idx, movie in enumerate(first, start=1):
+        print(f"{idx}. {movie['title']} ({movie[SCORE_KEYS['collab']]:.4f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+# scripts/request_batcher.py
+
+"""
+Micro-batching front for concurrent recommendation traffic.
+Incoming recommend requests are collected for a few milliseconds (or until a batch is full)
+and scored together, so many users cost one matrix-matrix product instead of one
+matrix-vector product each. Batches are scored on a thread pool, where NumPy releases
+the GIL, and each caller's future is resolved with its own top-N.
+"""
+
+import asyncio
+import functools
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from model_store import (
+    COLLAB_MODEL_DIR, CONTENT_MODEL_DIR, load_arrays, recommend_collab, recommend_collab_batch,
+    recommend_content_batch
+)
+
+# Largest number of requests scored together
+DEFAULT_MAX_BATCH_SIZE = 64
+
+# Longest time the first request of a batch waits for others to join it
+DEFAULT_MAX_WAIT_MS = 5.0
+
+# Queued by stop() behind the last request; the collector scores what it holds and exits
+STOP_COLLECTING = object()
+
+
+class RecommendationBatcher:
+    """
+    Coalesce concurrent recommend requests into batches.
+    recommend_batch(user_ids, ns, masks) must return one recommendation list per user;
+    see model_store.recommend_collab_batch and model_store.recommend_content_batch.
+    add_rating(user_id, movie_id, rating), if given, records a new rating for later requests;
+    see profile_cache.ProfileCache.add_rating and sharded_scoring.ShardedScorer.add_rating.
+    """
+
+    def __init__(self, recommend_batch, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS, num_threads=None, add_rating=None):
+        self.recommend_batch = recommend_batch
+        self.add_rating_callback = add_rating
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = ThreadPoolExecutor(max_workers=num_threads or os.cpu_count())
+        self.queue = asyncio.Queue()
+        self.collector = None
+        # Strong references to in-flight scoring tasks, which asyncio would otherwise let be collected
+        self.scoring_tasks = set()
+
+    async def start(self):
+        """
+        Start collecting requests on the running event loop.
+        """
+        self.collector = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        """
+        Stop accepting requests, score every request already queued, then shut down
+        the scoring threads. Every pending recommend() call is answered.
+        """
+        if self.collector is not None:
+            collector, self.collector = self.collector, None
+            await self.queue.put(STOP_COLLECTING)
+            try:
+                await collector
+            finally:
+                # Only left over if the collector failed; fail them rather than leave callers hanging
+                while not self.queue.empty():
+                    request = self.queue.get_nowait()
+                    if request is not STOP_COLLECTING and not request[3].done():
+                        request[3].set_exception(RuntimeError("RecommendationBatcher stopped"))
+        if self.scoring_tasks:
+            await asyncio.gather(*self.scoring_tasks, return_exceptions=True)
+        self.executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    async def recommend(self, user_id, n=10, mask=None):
+        """
+        Get top N recommendations for a user, optionally restricted by a filter mask
+        (see model_store.build_filter_mask); resolves once the user's batch has been scored.
+        Raises RuntimeError if the batcher is not running.
+        """
+        if self.collector is None:
+            raise RuntimeError("RecommendationBatcher is not running; call start() or use 'async with'")
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((user_id, n, mask, future))
+        return await future
+
+    async def add_rating(self, user_id, movie_id, rating):
+        """
+        Record a new rating on the scoring threads; requests made after it resolves see it.
+        Raises RuntimeError if the batcher is not running or was created without add_rating.
+        """
+        if self.collector is None:
+            raise RuntimeError("RecommendationBatcher is not running; call start() or use 'async with'")
+        if self.add_rating_callback is None:
+            raise RuntimeError("This model does not take new ratings; serve a content method with a profile cache")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.add_rating_callback, user_id, movie_id, rating)
+
+    async def _collect(self):
+        """
+        Gather requests into batches and hand each batch to the thread pool.
+        A batch closes when it is full or when its first request has waited max_wait.
+        Returns once it reaches STOP_COLLECTING, after handing off the batch it was building.
+        """
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            request = await self.queue.get()
+            if request is STOP_COLLECTING:
+                break
+            batch = [request]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                # Take whatever is already queued without the cost of a timed wait per request
+                try:
+                    request = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        request = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if request is STOP_COLLECTING:
+                    stopping = True
+                    break
+                batch.append(request)
+
+            # Score without awaiting, so the next batch can be collected meanwhile
+            task = asyncio.create_task(self._score(batch))
+            self.scoring_tasks.add(task)
+            task.add_done_callback(self.scoring_tasks.discard)
+
+    async def _score(self, batch):
+        """
+        Score one batch on the thread pool and resolve each request's future.
+        """
+        user_ids = [user_id for user_id, _, _, _ in batch]
+        ns = [n for _, n, _, _ in batch]
+        masks = [mask for _, _, mask, _ in batch]
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, self.recommend_batch, user_ids, ns, masks)
+        except Exception as e:
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, _, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+async def run_benchmark(model, user_ids, num_requests=2000, concurrency=256, n=10):
+    """
+    Compare one-user-at-a-time scoring with micro-batched scoring under concurrent load.
+    """
+    requests = [random.choice(user_ids) for _ in range(num_requests)]
+
+    start = time.perf_counter()
+    for user_id in requests:
+        recommend_collab(model, user_id, n)
+    sequential_time = time.perf_counter() - start
+    print(f"Sequential: {num_requests / sequential_time:,.0f} requests/s")
+
+    latencies = []
+    async with RecommendationBatcher(functools.partial(recommend_collab_batch, model)) as batcher:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def timed_request(user_id):
+            async with semaphore:
+                request_start = time.perf_counter()
+                await batcher.recommend(user_id, n)
+                latencies.append(time.perf_counter() - request_start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(timed_request(user_id) for user_id in requests))
+        batched_time = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"Batched:    {num_requests / batched_time:,.0f} requests/s "
+          f"(p50 {p50:.1f} ms, p99 {p99:.1f} ms, speed-up {sequential_time / batched_time:.1f}x)")
+
+
+async def serve_lines(recommend_batch, n=10, input_stream=sys.stdin, mask=None, add_rating=None):
+    """
+    Serve recommendations over a line protocol: read one user_id per line and print
+    "<user_id>: <titles>" as each answer completes. Concurrent lines are batched together.
+    An optional filter mask restricts every answer.
+    A line "rate <user_id> <movie_id> <rating>" records a new rating with add_rating before
+    any later line is read, and prints "<user_id>: rated <movie_id>" or the error.
+    A request whose scoring fails is answered with the error; later lines are still served.
+    """
+    async with RecommendationBatcher(recommend_batch, add_rating=add_rating) as batcher:
+        loop = asyncio.get_running_loop()
+        # Only unanswered requests are kept, so a long-running server does not accumulate tasks
+        pending = set()
+
+        async def answer(user_id):
+            try:
+                recommendations = await batcher.recommend(user_id, n, mask)
+            except Exception as e:
+                print(f"Error: {e}", flush=True)
+                return
+            titles = ', '.join(movie['title'] for movie in recommendations)
+            print(f"{user_id}: {titles}", flush=True)
+
+        while True:
+            line = await loop.run_in_executor(None, input_stream.readline)
+            if not line:
+                break
+            fields = line.split()
+            if len(fields) == 1 and fields[0].isdigit():
+                task = asyncio.create_task(answer(int(fields[0])))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            elif len(fields) == 4 and fields[0] == 'rate':
+                try:
+                    user_id, movie_id, rating = int(fields[1]), int(fields[2]), float(fields[3])
+                    await batcher.add_rating(user_id, movie_id, rating)
+                    print(f"{user_id}: rated {movie_id}", flush=True)
+                except (ValueError, RuntimeError) as e:
+                    print(f"Error: {e}", flush=True)
+        await asyncio.gather(*pending)
+
+
+def main():
+    # Choose which published model to serve
+    if '--content' in sys.argv:
+        model = load_arrays(CONTENT_MODEL_DIR)
+        recommend_batch = functools.partial(recommend_content_batch, model)
+    else:
+        model = load_arrays(COLLAB_MODEL_DIR)
+        recommend_batch = functools.partial(recommend_collab_batch, model)
+
+    if '--bench' in sys.argv:
+        collab_model = load_arrays(COLLAB_MODEL_DIR)
+        asyncio.run(run_benchmark(collab_model, list(collab_model['rating_user_ids'])))
+        return
+
+    asyncio.run(serve_lines(recommend_batch))
+
+
+if __name__ == "__main__":
+    main()
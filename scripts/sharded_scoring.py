@@ -0,0 +1,211 @@
+# scripts/sharded_scoring.py
+
+"""
+Catalog-sharded scoring for published models.
+The movie catalog is split into contiguous shards, each scored by its own worker process
+(standing in for a separate node) that attaches the model arrays and only touches its
+slice of the item factors or feature matrix. Workers speak a simple request/response
+protocol over a pipe and return their local top-K; a coordinator merges them.
+Ties are broken by catalog position everywhere, so the merged ranking is identical
+to the unsharded one.
+"""
+
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+from model_store import (
+    METHOD_MODEL_DIRS, SCORE_BLOCK_SIZE, SCORE_KEYS, load_arrays, lookup_rows, score_top_n_batch,
+    format_recommendations
+)
+from movie_db import resolve_generation
+
+
+def shard_bounds(n_movies, num_shards):
+    """
+    Split catalog positions [0, n_movies) into num_shards contiguous (start, end) ranges.
+    Boundaries fall on SCORE_BLOCK_SIZE multiples so every shard scores the same blocks
+    the unsharded path does, keeping scores bit-identical.
+    """
+    n_blocks = -(-n_movies // SCORE_BLOCK_SIZE)
+    edges = np.linspace(0, n_blocks, num_shards + 1).astype(int) * SCORE_BLOCK_SIZE
+    edges = np.minimum(edges, n_movies)
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def shard_worker(conn, model_dir, method, start, end, quantized=False, profile_cache_bytes=0):
+    """
+    Serve requests for catalog positions [start, end) until told to stop.
+    A request is ('score', user_ids, ns, masks), with masks covering just this shard's range,
+    or ('rate', user_id, movie_id, rating, rating_date);
+    each response is ('ok', result) or ('error', message). Content methods keep their own
+    profile cache when profile_cache_bytes > 0.
+    """
+    model = load_arrays(model_dir)
+    profile_cache = None
+    if method in ('content', 'profile') and profile_cache_bytes > 0:
+        from profile_cache import ProfileCache
+        profile_cache = ProfileCache(model, method, profile_cache_bytes)
+
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        try:
+            if request[0] == 'rate':
+                if profile_cache is None:
+                    raise RuntimeError("this shard has no profile cache to add ratings to")
+                profile_cache.add_rating(*request[1:])
+                conn.send(('ok', None))
+            else:
+                _, user_ids, ns, masks = request
+                conn.send(('ok', score_top_n_batch(model, method, user_ids, ns, masks, start, end, quantized,
+                                                   profile_cache)))
+        except Exception as e:
+            conn.send(('error', f"shard [{start}, {end}): {e!r}"))
+    conn.close()
+
+
+def shard_masks(masks, start, end):
+    """
+    Slice filter masks down to one shard's range before they are pickled to it.
+    A mask shared by several users is sliced once, so pickle still sends it only once.
+    """
+    if masks is None:
+        return None
+    sliced = {}
+    return [None if mask is None else sliced.setdefault(id(mask), mask[start:end]) for mask in masks]
+
+
+def merge_top_n(shard_results, ns):
+    """
+    Merge per-shard (positions, scores) top-K lists into each user's overall top n,
+    ordered by score and then position, as in the unsharded path.
+    """
+    merged = []
+    for user_index, n in enumerate(ns):
+        positions = np.concatenate([result[user_index][0] for result in shard_results])
+        scores = np.concatenate([result[user_index][1] for result in shard_results])
+        order = np.lexsort((positions, -scores))[:n]
+        merged.append((positions[order], scores[order]))
+    return merged
+
+
+class ShardedScorer:
+    """
+    Coordinator for a set of shard worker processes over one published model.
+    recommend_batch has the same signature and results as model_store.recommend_*_batch.
+    With quantized=True each shard selects its candidates from the quantized arrays, and with
+    profile_cache_bytes > 0 each shard caches content profiles (see profile_cache).
+    """
+
+    def __init__(self, model_dir, method, num_shards, quantized=False, profile_cache_bytes=0):
+        self.method = method
+        self.profile_cache_bytes = profile_cache_bytes
+        # Pin one generation so the coordinator and every shard score the same publish
+        model_dir = resolve_generation(model_dir)
+        self.model = load_arrays(model_dir)
+        # One request at a time goes over the pipes; callers may be on several threads
+        self.lock = threading.Lock()
+        self.connections = []
+        self.processes = []
+        self.bounds = shard_bounds(len(self.model['movie_ids']), num_shards)
+
+        context = multiprocessing.get_context('spawn')
+        for start, end in self.bounds:
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=shard_worker, args=(child_conn, model_dir, method, int(start), int(end), quantized, profile_cache_bytes),
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self.connections.append(parent_conn)
+            self.processes.append(process)
+
+    def request_all(self, request):
+        """
+        Send a request to every shard and collect their results. request is either one
+        request for all shards or a function of a shard's (start, end) returning its request.
+        """
+        with self.lock:
+            for conn, (start, end) in zip(self.connections, self.bounds):
+                conn.send(request(start, end) if callable(request) else request)
+            responses = [conn.recv() for conn in self.connections]
+
+        for status, payload in responses:
+            if status != 'ok':
+                raise RuntimeError(payload)
+        return [payload for _, payload in responses]
+
+    def recommend_batch(self, user_ids, ns, masks=None):
+        """
+        Score a batch on every shard in parallel and merge the per-shard top-K lists.
+        Each shard is sent only its slice of the filter masks.
+        """
+        user_ids, ns = list(user_ids), list(ns)
+        top_n = merge_top_n(self.request_all(
+            lambda start, end: ('score', user_ids, ns, shard_masks(masks, start, end))
+        ), ns)
+        return format_recommendations(self.model, top_n, SCORE_KEYS[self.method])
+
+    def add_rating(self, user_id, movie_id, rating, rating_date=None):
+        """
+        Pass a new rating to every shard's profile cache.
+        Raises RuntimeError if the shards keep no profile cache, which would ignore the rating,
+        and ValueError for a movie that is not in the model.
+        """
+        if self.method not in ('content', 'profile') or self.profile_cache_bytes <= 0:
+            raise RuntimeError("Adding ratings needs a content method with a profile cache")
+        if not lookup_rows(self.model['movie_ids'], [movie_id])[1][0]:
+            raise ValueError(f"Unknown movie_id: {movie_id}")
+        self.request_all(('rate', user_id, movie_id, rating, rating_date))
+
+    def close(self):
+        """
+        Stop the shard workers.
+        """
+        for conn in self.connections:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            conn.close()
+        for process in self.processes:
+            process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def main():
+    # Compare sharded against unsharded scoring for increasing shard counts
+    method = 'profile' if '--profile' in sys.argv else 'content' if '--content' in sys.argv else 'collab'
+    model_dir = METHOD_MODEL_DIRS[method]
+    model = load_arrays(model_dir)
+
+    user_ids = list(model['rating_user_ids'][:256])
+    ns = [10] * len(user_ids)
+
+    start = time.perf_counter()
+    expected = format_recommendations(model, score_top_n_batch(model, method, user_ids, ns), SCORE_KEYS[method])
+    print(f"unsharded: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    for num_shards in sorted({1, 2, 4, os.cpu_count()}):
+        with ShardedScorer(model_dir, method, num_shards) as scorer:
+            scorer.recommend_batch(user_ids[:1], ns[:1])  # warm up the workers
+            start = time.perf_counter()
+            results = scorer.recommend_batch(user_ids, ns)
+            elapsed = time.perf_counter() - start
+        status = 'identical' if results == expected else 'MISMATCH'
+        print(f"{num_shards} shard(s): {elapsed * 1000:.1f} ms, {status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+# scripts/snapshot.py
+
+"""
+Columnar snapshot of the movie database for fast analytic and training loads.
+Each table is exported to a directory of typed NumPy .npy columns: integers and reals as
+numeric arrays, dates as datetime64[D], and strings dictionary-encoded as int32 codes into
+the sorted distinct values, kept as offsets into one UTF-8 byte buffer. Loaders memory-map the columns instead of iterating
+SQL rows, and fall back to SQLite when the snapshot is missing or was exported from another
+database generation.
+"""
+
+import os
+import json
+import shutil
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from model_store import load_arrays
+from movie_db import connect_readonly, generation_key
+
+# Tables exported to the snapshot
+SNAPSHOT_TABLES = [
+    'rating', 'movie', 'user', 'genre', 'director', 'person', 'language', 'country', 'production_company',
+    'movie_genre', 'movie_director', 'movie_cast', 'movie_spoken_language', 'production_country',
+    'movie_production_company',
+]
+
+# Rows fetched from SQLite per chunk while exporting
+EXPORT_CHUNK_SIZE = 100000
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def snapshot_dir_for(db_path):
+    """
+    Return the snapshot directory belonging to a database: a 'snapshot' directory next to it.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'snapshot')
+
+
+def column_kind(declared_type):
+    """
+    Map a declared SQLite column type to the snapshot's storage kind.
+    """
+    declared_type = declared_type.upper()
+    if 'INT' in declared_type:
+        return 'int'
+    if 'REAL' in declared_type:
+        return 'real'
+    if 'DATE' in declared_type:
+        return 'date'
+    return 'text'
+
+
+def column_dtype(kind):
+    """
+    Return the dtype of the row array stored for a column of the given kind.
+    """
+    return {'int': np.int64, 'real': np.float64, 'date': 'datetime64[D]', 'text': np.int32}[kind]
+
+
+def create_dictionary(conn, table, name):
+    """
+    Collect the distinct values of a text column into a temporary table numbered in sorted
+    order, so rows can be coded by a join instead of a Python lookup. Returns the temporary
+    table's name.
+    """
+    dictionary_table = f"snapshot_{table}_{name}"
+    conn.execute(f"DROP TABLE IF EXISTS temp.{dictionary_table};")
+    conn.execute(f"""
+        CREATE TEMP TABLE {dictionary_table} AS
+        SELECT value, ROW_NUMBER() OVER (ORDER BY value) - 1 AS code
+        FROM (SELECT DISTINCT CAST({name} AS TEXT) AS value FROM {table} WHERE {name} IS NOT NULL);
+    """)
+    conn.execute(f"CREATE UNIQUE INDEX temp.{dictionary_table}_value ON {dictionary_table}(value);")
+    return dictionary_table
+
+
+def export_dictionary(conn, dictionary_table, name, table_dir):
+    """
+    Write a text column's sorted distinct values as one UTF-8 byte buffer plus int64 offsets,
+    so each value takes only its own length rather than the longest value's.
+    """
+    count, size = conn.execute(
+        f"SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(value AS BLOB))), 0) FROM {dictionary_table};"
+    ).fetchone()
+    offsets = open_memmap(os.path.join(table_dir, f"{name}_offsets.npy"), mode='w+', dtype=np.int64, shape=(count + 1,))
+    buffer = open_memmap(os.path.join(table_dir, f"{name}_bytes.npy"), mode='w+', dtype=np.uint8, shape=(size,))
+    offsets[0] = 0
+    position, end = 1, 0
+    cur = conn.execute(f"SELECT CAST(value AS BLOB) FROM {dictionary_table} ORDER BY code;")
+    while True:
+        rows = cur.fetchmany(EXPORT_CHUNK_SIZE)
+        if not rows:
+            break
+        lengths = np.fromiter((len(value) for value, in rows), dtype=np.int64, count=len(rows))
+        ends = end + np.cumsum(lengths)
+        offsets[position:position + len(rows)] = ends
+        buffer[end:ends[-1]] = np.frombuffer(b''.join(value for value, in rows), dtype=np.uint8)
+        position, end = position + len(rows), int(ends[-1])
+    offsets.flush()
+    buffer.flush()
+
+
+def export_table(conn, table, table_dir):
+    """
+    Export one table into table_dir, reading it from SQLite in chunks. Returns the row count.
+    Every column is preallocated as a memory-mapped .npy once the row count is known and
+    each chunk is written straight into it, so memory stays bounded by the chunk size.
+    Integer columns with NULLs get a companion '_valid' mask, reals use NaN and dates NaT;
+    strings are stored as int32 codes (-1 for NULL) into a sorted dictionary.
+    """
+    columns = [(row[1], column_kind(row[2])) for row in conn.execute(f"PRAGMA table_info({table});")]
+    n_rows = conn.execute(f"SELECT COUNT(*) FROM {table};").fetchone()[0]
+
+    # Write into a scratch directory and swap it in whole once every column is complete
+    tmp_dir = table_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    selects, joins, outputs, dictionary_tables = [], [], {}, []
+    for name, kind in columns:
+        suffix = '_codes' if kind == 'text' else ''
+        outputs[name] = open_memmap(os.path.join(tmp_dir, f"{name}{suffix}.npy"), mode='w+', dtype=column_dtype(kind), shape=(n_rows,))
+        if kind == 'text':
+            dictionary_table = create_dictionary(conn, table, name)
+            dictionary_tables.append(dictionary_table)
+            export_dictionary(conn, dictionary_table, name, tmp_dir)
+            joins.append(f"LEFT JOIN {dictionary_table} ON {dictionary_table}.value = CAST(t.{name} AS TEXT)")
+            selects.append(f"COALESCE({dictionary_table}.code, -1)")
+        else:
+            selects.append(f"t.{name}")
+    valid = {
+        name: open_memmap(os.path.join(tmp_dir, f"{name}_valid.npy"), mode='w+', dtype=bool, shape=(n_rows,))
+        for name, kind in columns if kind == 'int'
+    }
+    has_nulls = set()
+
+    cur = conn.cursor()
+    cur.execute(f"SELECT {', '.join(selects)} FROM {table} AS t {' '.join(joins)};")
+    start = 0
+    while True:
+        rows = cur.fetchmany(EXPORT_CHUNK_SIZE)
+        if not rows:
+            break
+        end = start + len(rows)
+        for (name, kind), values in zip(columns, zip(*rows)):
+            if kind == 'int':
+                present = np.fromiter((value is not None for value in values), dtype=bool, count=len(values))
+                valid[name][start:end] = present
+                if not present.all():
+                    has_nulls.add(name)
+                outputs[name][start:end] = [value if value is not None else 0 for value in values]
+            elif kind == 'real':
+                outputs[name][start:end] = [value if value is not None else np.nan for value in values]
+            elif kind == 'date':
+                outputs[name][start:end] = np.array([value if value else 'NaT' for value in values], dtype='datetime64[D]')
+            else:
+                outputs[name][start:end] = values
+        start = end
+
+    for output in [*outputs.values(), *valid.values()]:
+        output.flush()
+    del outputs, valid
+    for dictionary_table in dictionary_tables:
+        conn.execute(f"DROP TABLE temp.{dictionary_table};")
+    # Columns without NULLs need no validity mask
+    for name, kind in columns:
+        if kind == 'int' and name not in has_nulls:
+            os.remove(os.path.join(tmp_dir, f"{name}_valid.npy"))
+
+    shutil.rmtree(table_dir, ignore_errors=True)
+    os.replace(tmp_dir, table_dir)
+    return n_rows
+
+
+def export_snapshot(db_path, snapshot_dir=None):
+    """
+    Export every snapshot table of the database.
+    The manifest is removed first and written last, so a partially exported snapshot
+    is never mistaken for a fresh one.
+    """
+    snapshot_dir = snapshot_dir or snapshot_dir_for(db_path)
+    os.makedirs(snapshot_dir, exist_ok=True)
+    manifest_path = os.path.join(snapshot_dir, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    # Resolve the generation once, so the manifest names exactly the data that was exported
+    source = generation_key(db_path)
+    conn = connect_readonly(source['source'])
+    row_counts = {}
+    for table in SNAPSHOT_TABLES:
+        row_counts[table] = export_table(conn, table, os.path.join(snapshot_dir, table))
+        print(f"Exported {table}: {row_counts[table]} rows")
+    conn.close()
+
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump({**source, 'row_counts': row_counts}, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+
+def fresh_snapshot_dir(db_path, snapshot_dir=None, source=None):
+    """
+    Return the database's snapshot directory if it is complete and was exported from the
+    generation db_path points to (or from source, a movie_db.generation_key), otherwise None.
+    """
+    snapshot_dir = snapshot_dir or snapshot_dir_for(db_path)
+    manifest_path = os.path.join(snapshot_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    if source is None:
+        # db_path itself may not exist when it is published through a pointer file
+        try:
+            source = generation_key(db_path)
+        except FileNotFoundError:
+            return None
+    with open(manifest_path, 'r') as f:
+        manifest = json.load(f)
+    if any(manifest.get(key) != value for key, value in source.items()):
+        return None
+    return snapshot_dir
+
+
+def load_snapshot_table(db_path, table, source=None):
+    """
+    Memory-map a table's columns from a fresh snapshot, or return None if there is none.
+    """
+    snapshot_dir = fresh_snapshot_dir(db_path, source=source)
+    if snapshot_dir is None:
+        return None
+    return load_arrays(os.path.join(snapshot_dir, table))
+
+
+def decode_strings(table_arrays, column):
+    """
+    Decode a dictionary-encoded string column into an object array, with None for NULL.
+    Only the dictionary entries the column actually uses are decoded.
+    """
+    codes = np.asarray(table_arrays[f"{column}_codes"])
+    offsets = table_arrays[f"{column}_offsets"]
+    buffer = table_arrays[f"{column}_bytes"]
+    decoded = np.empty(len(codes), dtype=object)
+    present = codes >= 0
+    used, inverse = np.unique(codes[present], return_inverse=True)
+    values = np.array([bytes(buffer[offsets[code]:offsets[code + 1]]).decode('utf-8') for code in used], dtype=object)
+    decoded[present] = values[inverse]
+    return decoded
+
+
+def main():
+    # Path to your SQLite database
+    db_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'movies.db')
+    export_snapshot(db_path)
+    print(f"Snapshot written to {snapshot_dir_for(db_path)}")
+
+
+if __name__ == "__main__":
+    main()
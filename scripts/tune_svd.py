@@ -0,0 +1,288 @@
+# scripts/tune_svd.py
+
+"""
+Hyperparameter search for the collaborative filtering SVD model.
+Builds a train/validation split of the rating table once, evaluates candidate
+configurations in parallel worker processes with early stopping on validation RMSE,
+and writes the best configuration for build_collaborative_filtering_model to pick up,
+plus a table of every result.
+"""
+
+import os
+import csv
+import json
+import time
+import shutil
+import random
+import argparse
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from model_store import MODEL_DIR, RATING_SCALE, save_arrays, load_arrays, lookup_rows, rating_days, decay_weights
+from collab_filtering import SVD_PARAMS_PATH, decayed_sample_mask
+from snapshot import load_snapshot_table
+from movie_db import connect_readonly, generation_key
+
+# Cached train/validation split, stored as integer and float arrays
+SPLIT_DIR = os.path.join(MODEL_DIR, 'tuning_split')
+
+# Every evaluated configuration, best first
+RESULTS_PATH = os.path.join(MODEL_DIR, 'svd_tuning_results.csv')
+
+# Candidate values for each hyperparameter
+PARAM_GRID = {
+    'n_factors': [20, 50, 100, 150],
+    'lr_all': [0.002, 0.005, 0.01],
+    'reg_all': [0.02, 0.05, 0.1],
+}
+
+# Early stopping: validation RMSE is checked after each of these epoch counts, and a
+# configuration stops at the first check that does not improve on the previous one.
+# Surprise's SVD cannot resume training, so every check trains from scratch: checking at
+# doubling epoch counts bounds a full run at 130 epochs, about 2.2x one 60-epoch fit.
+EVAL_EPOCHS = (10, 20, 40, 60)
+
+VALIDATION_FRACTION = 0.2
+RANDOM_SEED = 42
+
+# Per-process cache of the split and its Surprise trainset, built once per worker
+_worker_state = {}
+
+
+def build_split(db_path, split_dir=SPLIT_DIR, validation_fraction=VALIDATION_FRACTION, half_life_days=None):
+    """
+    Split the rating table into train and validation arrays and save them to split_dir.
+    With a half-life in days the split matches decayed training: the train ratings are
+    sampled as build_collaborative_filtering_model samples them, and validation errors are
+    weighted by each rating's decay weight.
+    The split is reused as long as it was built from the same database generation with the
+    same validation fraction, half-life and seed.
+    """
+    source = generation_key(db_path)
+    split_key = json.dumps({
+        **source,
+        'validation_fraction': validation_fraction,
+        'half_life_days': half_life_days,
+        'seed': RANDOM_SEED,
+    }, sort_keys=True)
+    key_path = os.path.join(split_dir, 'split_key.npy')
+    if os.path.exists(key_path) and str(np.load(key_path)) == split_key:
+        print("Reusing cached train/validation split.")
+        return
+
+    rating = load_snapshot_table(db_path, 'rating', source)
+    if rating is not None:
+        ratings = np.column_stack([rating['user_id'], rating['movie_id'], rating['rating']]).astype(np.float64)
+        days = rating_days(rating['rating_date']) if half_life_days else None
+    else:
+        conn = connect_readonly(source['source'])
+        rows = conn.execute("SELECT user_id, movie_id, rating, rating_date FROM rating;").fetchall()
+        conn.close()
+        ratings = np.array([row[:3] for row in rows], dtype=np.float64).reshape(-1, 3)
+        days = rating_days([row[3] for row in rows]) if half_life_days else None
+    rng = np.random.default_rng(RANDOM_SEED)
+    order = rng.permutation(len(ratings))
+    n_validation = int(len(ratings) * validation_fraction)
+    validation, train = order[:n_validation], order[n_validation:]
+
+    extra = {}
+    if half_life_days:
+        weights, reference_day = decay_weights(days, half_life_days)
+        train = train[decayed_sample_mask(ratings[train, 0], ratings[train, 1], days[train], half_life_days,
+                                          reference_day)]
+        extra['validation_weights'] = weights[validation]
+
+    # Start from an empty directory, so no array of an earlier split (such as its weights) lingers
+    shutil.rmtree(split_dir, ignore_errors=True)
+    save_arrays({
+        'train_users': ratings[train, 0].astype(np.int64),
+        'train_items': ratings[train, 1].astype(np.int64),
+        'train_ratings': ratings[train, 2].astype(np.float32),
+        'validation_users': ratings[validation, 0].astype(np.int64),
+        'validation_items': ratings[validation, 1].astype(np.int64),
+        'validation_ratings': ratings[validation, 2].astype(np.float32),
+        **extra,
+        'split_key': np.array(split_key),
+    }, split_dir)
+    print(f"Built train/validation split: {len(train)} train, {n_validation} validation ratings.")
+
+
+def get_worker_state(split_dir):
+    """
+    Attach the cached split and build its Surprise trainset, once per worker process.
+    """
+    if split_dir not in _worker_state:
+        import pandas as pd
+        from surprise import Dataset, Reader
+
+        split = load_arrays(split_dir)
+        train_df = pd.DataFrame({
+            'user_id': split['train_users'],
+            'movie_id': split['train_items'],
+            'rating': split['train_ratings'],
+        })
+        reader = Reader(rating_scale=RATING_SCALE)
+        trainset = Dataset.load_from_df(train_df, reader).build_full_trainset()
+
+        # Raw ids in inner-id order, sorted for vectorised lookup of validation ids
+        user_raw_ids = np.array([trainset.to_raw_uid(u) for u in range(trainset.n_users)], dtype=np.int64)
+        item_raw_ids = np.array([trainset.to_raw_iid(i) for i in range(trainset.n_items)], dtype=np.int64)
+        user_order = np.argsort(user_raw_ids)
+        item_order = np.argsort(item_raw_ids)
+        user_rows, known_users = lookup_rows(user_raw_ids[user_order], split['validation_users'])
+        item_rows, known_items = lookup_rows(item_raw_ids[item_order], split['validation_items'])
+
+        _worker_state[split_dir] = {
+            'trainset': trainset,
+            'validation_user_inner': user_order[user_rows],
+            'validation_item_inner': item_order[item_rows],
+            'known_users': known_users,
+            'known_items': known_items,
+            'validation_ratings': np.asarray(split['validation_ratings'], dtype=np.float64),
+            'validation_weights': split.get('validation_weights'),
+        }
+    return _worker_state[split_dir]
+
+
+def validation_rmse(algo, state):
+    """
+    Compute RMSE on the validation ratings, vectorising SVD.predict:
+    user and item terms are only added for users and items seen in training.
+    Errors are weighted by the ratings' decay weights when the split has them.
+    """
+    users, items = state['validation_user_inner'], state['validation_item_inner']
+    known_users, known_items = state['known_users'], state['known_items']
+    both = known_users & known_items
+
+    estimates = np.full(len(users), algo.trainset.global_mean)
+    estimates[known_users] += algo.bu[users[known_users]]
+    estimates[known_items] += algo.bi[items[known_items]]
+    estimates[both] += np.einsum('ij,ij->i', algo.pu[users[both]], algo.qi[items[both]])
+    np.clip(estimates, *RATING_SCALE, out=estimates)
+
+    return float(np.sqrt(np.average((estimates - state['validation_ratings']) ** 2,
+                                    weights=state['validation_weights'])))
+
+
+def evaluate_config(split_dir, params, deadline):
+    """
+    Train one configuration with early stopping on validation RMSE, checked at EVAL_EPOCHS.
+    Surprise's SVD cannot resume training, but it is deterministic for a fixed random_state,
+    so a model trained for k epochs is exactly the k-epoch checkpoint of a longer run;
+    each check trains a fresh model for that many epochs.
+    Stops early once the deadline has passed, returning the best checkpoint so far.
+    """
+    from surprise import SVD
+
+    state = get_worker_state(split_dir)
+    start = time.time()
+    best_rmse, best_epochs = float('inf'), 0
+
+    for n_epochs in EVAL_EPOCHS:
+        if time.time() > deadline:
+            break
+        algo = SVD(**params, n_epochs=n_epochs, random_state=RANDOM_SEED)
+        algo.fit(state['trainset'])
+        rmse = validation_rmse(algo, state)
+
+        if rmse >= best_rmse:
+            break
+        best_rmse, best_epochs = rmse, n_epochs
+
+    return {**params, 'n_epochs': best_epochs, 'rmse': best_rmse, 'seconds': round(time.time() - start, 2)}
+
+
+def candidate_configs(search, num_trials):
+    """
+    List the configurations to evaluate: the full grid, or num_trials random grid points.
+    """
+    keys = list(PARAM_GRID)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*PARAM_GRID.values())]
+    if search == 'random':
+        random.Random(RANDOM_SEED).shuffle(grid)
+        grid = grid[:num_trials]
+    return grid
+
+
+def run_search(db_path, search='random', num_trials=12, budget_seconds=600, num_workers=None,
+               split_dir=SPLIT_DIR, half_life_days=None):
+    """
+    Evaluate candidate configurations across a process pool within a wall-clock budget.
+    With a half-life in days, configurations are tuned for time-decayed training (see build_split).
+    Configurations not started when the budget runs out are cancelled; running ones stop at
+    their next check and their best checkpoint so far is still collected.
+    Returns the completed results, best first.
+    """
+    build_split(db_path, split_dir, half_life_days=half_life_days)
+    configs = candidate_configs(search, num_trials)
+    deadline = time.time() + budget_seconds
+
+    results = []
+
+    def collect(futures):
+        for future in futures:
+            result = future.result()
+            if result['n_epochs'] > 0:
+                results.append(result)
+                print(f"n_factors={result['n_factors']} lr_all={result['lr_all']} "
+                      f"reg_all={result['reg_all']}: RMSE {result['rmse']:.4f} "
+                      f"at {result['n_epochs']} epochs ({result['seconds']}s)")
+
+    with ProcessPoolExecutor(max_workers=num_workers or os.cpu_count()) as executor:
+        pending = {executor.submit(evaluate_config, split_dir, params, deadline) for params in configs}
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.time(), 0), return_when=FIRST_COMPLETED)
+            collect(done)
+            if pending and time.time() > deadline:
+                # cancel() only succeeds for configurations that have not started
+                running = [future for future in pending if not future.cancel()]
+                print("Tuning budget exhausted; stopping search.")
+                collect(wait(running).done)
+                break
+
+    results.sort(key=lambda result: result['rmse'])
+    return results
+
+
+def write_results(results, params_path=SVD_PARAMS_PATH, results_path=RESULTS_PATH):
+    """
+    Write the full results table and the best configuration.
+    """
+    os.makedirs(os.path.dirname(results_path), exist_ok=True)
+    with open(results_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+
+    best = results[0]
+    with open(params_path, 'w') as f:
+        json.dump(best, f, indent=2)
+
+
+def main():
+    # Path to your SQLite database
+    db_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'movies.db')
+
+    parser = argparse.ArgumentParser(description="Tune SVD hyperparameters on a validation split.")
+    parser.add_argument('--search', choices=['grid', 'random'], default='random')
+    parser.add_argument('--trials', type=int, default=12, help="Configurations to try in a random search")
+    parser.add_argument('--budget', type=float, default=600, help="Wall-clock budget in seconds")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--half-life', type=float, default=None, help="Tune for ratings decayed with this half-life in days")
+    args = parser.parse_args()
+
+    results = run_search(db_path, args.search, args.trials, args.budget, args.workers, half_life_days=args.half_life)
+    if not results:
+        print("No configuration finished within the budget.")
+        return
+
+    write_results(results)
+    best = results[0]
+    print(f"\nBest configuration: n_factors={best['n_factors']}, n_epochs={best['n_epochs']}, "
+          f"lr_all={best['lr_all']}, reg_all={best['reg_all']} (RMSE {best['rmse']:.4f})")
+    print(f"Saved to {SVD_PARAMS_PATH}; all results in {RESULTS_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# tests/conftest.py
+
+"""
+Shared fixtures: put scripts/ on the import path and build a small synthetic movie database
+with the real schema, so tests run without downloading the source datasets.
+"""
+
+import datetime
+import os
+import random
+import sqlite3
+import sys
+
+import pytest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(__file__), '..', 'scripts')
+sys.path.insert(0, os.path.abspath(SCRIPTS_DIR))
+
+GENRES = ('Drama', 'Comedy', 'Action', 'Crime', 'Romance')
+CERTIFICATES = ('PG', 'PG-13', 'R', None)
+WORDS = ('heist', 'love', 'war', 'family', 'space', 'detective', 'island', 'revenge', 'music', 'city')
+
+
+def build_test_db(db_path, n_movies=600, n_users=80, seed=0):
+    """
+    Create a database with the repository schema and deterministic synthetic movies,
+    genres, users and dated ratings.
+    """
+    from load_movie_data import create_tables
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA foreign_keys = ON;')
+    create_tables(conn)
+
+    conn.executemany("INSERT INTO language VALUES (?, ?);", [('en', 'English'), ('fr', 'French')])
+    conn.executemany("INSERT INTO genre (genre_name) VALUES (?);", [(genre,) for genre in GENRES])
+    for movie_id in range(1, n_movies + 1):
+        overview = ' '.join(rng.sample(WORDS, 3)) if movie_id % 7 else None
+        conn.execute("""
+        INSERT INTO movie (movie_id, original_title, english_title, overview, certificate, runtime,
+                           release_date, original_language_code, imdb_rating)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);
+        """, (
+            movie_id, f"Movie {movie_id} {WORDS[movie_id % len(WORDS)]}", None, overview,
+            CERTIFICATES[movie_id % len(CERTIFICATES)], 80 + movie_id, f"{1960 + movie_id}-01-01",
+            'en' if movie_id % 5 else 'fr', 5 + (movie_id % 50) / 10
+        ))
+        for genre_id in {1 + movie_id % len(GENRES), 1 + (movie_id // 3) % len(GENRES)}:
+            conn.execute("INSERT INTO movie_genre VALUES (?, ?);", (movie_id, genre_id))
+
+    movie_ids = list(range(1, n_movies + 1))
+    for user_id in range(1, n_users + 1):
+        conn.execute("INSERT INTO user VALUES (?);", (user_id,))
+        for movie_id in rng.sample(movie_ids, rng.randint(3, 20)):
+            rating_date = datetime.date(2015, 1, 1) + datetime.timedelta(days=rng.randint(0, 1500))
+            conn.execute("INSERT INTO rating VALUES (?, ?, ?, ?);",
+                         (user_id, movie_id, rng.randint(1, 10) / 2, rating_date.isoformat()))
+
+    from movie_search import rebuild_search_index
+    rebuild_search_index(conn)
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+@pytest.fixture(scope='session')
+def shared_db_path(tmp_path_factory):
+    """
+    A synthetic database shared by tests that only read it.
+    """
+    return build_test_db(str(tmp_path_factory.mktemp('db') / 'movies.db'))
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """
+    A fresh synthetic database for tests that modify it.
+    """
+    return build_test_db(str(tmp_path / 'movies.db'))
+
+
+@pytest.fixture(scope='session')
+def model_dirs(shared_db_path, tmp_path_factory):
+    """
+    Collaborative and content models published from the shared database, keyed by method.
+    """
+    from model_store import publish_collab_model, publish_content_model
+
+    root = tmp_path_factory.mktemp('model')
+    collab_dir, content_dir = str(root / 'collab'), str(root / 'content')
+    publish_collab_model(shared_db_path, collab_dir)
+    publish_content_model(shared_db_path, content_dir, include_overview=True)
+    return {'collab': collab_dir, 'content': content_dir, 'profile': content_dir}
@@ -0,0 +1,115 @@
+# tests/test_decay.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import tune_svd
+from collab_filtering import decayed_sample_mask, decayed_sample
+from model_store import (
+    DECAY_EXPONENT_LIMIT, rating_days, decay_weights, decay_factor, advance_decay_weights, publish_content_model,
+    load_arrays, recommend_batch, batch_rated_items
+)
+from profile_cache import ProfileCache
+
+HALF_LIFE_DAYS = 30.0
+
+
+def test_weights_stay_finite_and_positive():
+    reference_day = float(rating_days(['2017-06-01'])[0])
+    days = rating_days([str(np.datetime64('today')), '1950-01-01', '2017-06-01', None])
+    # A week's half-life puts both ends far past where float32 overflows or underflows
+    weights, _ = decay_weights(days, 7.0, reference_day)
+    assert np.all(np.isfinite(weights)) and np.all(weights > 0)
+    assert weights[0] == np.float32(2.0 ** DECAY_EXPONENT_LIMIT)
+    assert weights[1] == np.float32(2.0 ** -DECAY_EXPONENT_LIMIT)
+    assert weights[2] == 1 and weights[3] == 1
+
+
+def test_advancing_matches_recomputing():
+    days = rating_days(['2017-01-01', '2017-03-01', '2017-05-01'])
+    weights, reference_day = decay_weights(days, HALF_LIFE_DAYS)
+    later = reference_day + 45
+    np.testing.assert_allclose(advance_decay_weights(weights, reference_day, later, HALF_LIFE_DAYS),
+                               decay_weights(days, HALF_LIFE_DAYS, later)[0], rtol=1e-6)
+    assert decay_factor(reference_day, later, HALF_LIFE_DAYS) == pytest.approx(2 ** -1.5)
+
+
+@pytest.fixture(scope='module')
+def decayed_model(shared_db_path, tmp_path_factory):
+    model_dir = str(tmp_path_factory.mktemp('decayed') / 'content')
+    publish_content_model(shared_db_path, model_dir, half_life_days=HALF_LIFE_DAYS)
+    return load_arrays(model_dir)
+
+
+def unrated_movie(model, user_id):
+    _, rated_items, _, _ = batch_rated_items(model, [user_id])
+    return int(model['movie_ids'][np.setdiff1d(np.arange(len(model['movie_ids'])), rated_items)[0]])
+
+
+def test_rating_dated_today_rebases_the_cache(decayed_model):
+    user_id = int(decayed_model['rating_user_ids'][0])
+    movie_id = unrated_movie(decayed_model, user_id)
+
+    # One cache updates a cached profile in place, the other builds it after the rating
+    updated = ProfileCache(decayed_model, 'profile')
+    recommend_batch(decayed_model, 'profile', [user_id], [10], profile_cache=updated)
+    updated.add_rating(user_id, movie_id, 5.0)
+    rebuilt = ProfileCache(decayed_model, 'profile')
+    rebuilt.add_rating(user_id, movie_id, 5.0)
+
+    today = float(rating_days([np.datetime64('today')])[0])
+    assert updated.reference_day == today > float(decayed_model['rating_reference_day'])
+    for cache in (updated, rebuilt):
+        recommendations = recommend_batch(decayed_model, 'profile', [user_id], [10], profile_cache=cache)[0]
+        assert len(recommendations) == 10
+        assert all(np.isfinite(movie['similarity_score']) for movie in recommendations)
+        # Today's rating has weight 1 and dominates the years-old published ratings
+        assert cache.entries[user_id]['rated_weights'].max() == 1
+    assert updated.entries[user_id]['total'] == pytest.approx(rebuilt.entries[user_id]['total'], rel=1e-5)
+
+
+def test_sample_keeps_every_user_and_movie():
+    rng = np.random.default_rng(0)
+    users, items = rng.integers(0, 200, 5000), rng.integers(0, 800, 5000)
+    days = rng.uniform(16000, 18000, 5000)
+    keep = decayed_sample_mask(users, items, days, HALF_LIFE_DAYS)
+
+    assert set(users[keep]) == set(users) and set(items[keep]) == set(items)
+    assert keep.sum() < len(keep)
+    np.testing.assert_array_equal(keep, decayed_sample_mask(users, items, days, HALF_LIFE_DAYS))
+
+
+def test_sample_tracks_the_weights_per_user():
+    # Without forced movie keeps, each user keeps about the sum of their weights
+    days = np.arange(40, dtype=np.float64) * 10
+    users, items = np.zeros(40, dtype=np.int64), np.zeros(40, dtype=np.int64)
+    weights, _ = decay_weights(days, HALF_LIFE_DAYS)
+    keep = decayed_sample_mask(users, items, days, HALF_LIFE_DAYS)
+    assert abs(keep.sum() - weights.sum()) <= 1
+    assert keep[-1]
+
+
+def test_decayed_sample_filters_a_dataframe():
+    ratings_df = pd.DataFrame({
+        'user_id': ['1', '1', '1', '2'], 'movie_id': ['10', '11', '10', '11'], 'rating': [4.0, 3.0, 5.0, 2.0],
+        'rating_date': ['2010-01-01', '2010-01-02', '2020-01-01', '2010-01-01'],
+    })
+    sample = decayed_sample(ratings_df, HALF_LIFE_DAYS)
+    assert set(sample['user_id']) == {'1', '2'} and set(sample['movie_id']) == {'10', '11'}
+
+
+def test_tuning_split_is_decayed_like_training(shared_db_path, tmp_path):
+    split_dir = str(tmp_path / 'split')
+    tune_svd.build_split(shared_db_path, split_dir)
+    full = load_arrays(split_dir)
+    n_train = len(full['train_ratings'])
+    assert 'validation_weights' not in full
+
+    tune_svd.build_split(shared_db_path, split_dir, half_life_days=HALF_LIFE_DAYS)
+    decayed = load_arrays(split_dir)
+    assert len(decayed['train_ratings']) < n_train
+    assert len(decayed['validation_weights']) == len(decayed['validation_ratings'])
+
+    tune_svd.build_split(shared_db_path, split_dir)
+    assert 'validation_weights' not in load_arrays(split_dir)
@@ -0,0 +1,65 @@
+# tests/test_filters.py
+
+import sqlite3
+
+import numpy as np
+import pytest
+
+from model_store import load_attribute_arrays, build_filter_mask, top_n_positions_batch
+
+
+@pytest.fixture(scope='module')
+def attribute_model(shared_db_path):
+    movie_ids = np.arange(1, 601, dtype=np.int64)
+    model = {'movie_ids': movie_ids}
+    model.update(load_attribute_arrays(shared_db_path, movie_ids))
+    return model
+
+
+def expected_ids(db_path, sql, params=()):
+    conn = sqlite3.connect(db_path)
+    ids = sorted(movie_id for (movie_id,) in conn.execute(sql, params))
+    conn.close()
+    return ids
+
+
+def test_genres_must_all_match(attribute_model, shared_db_path):
+    mask = build_filter_mask(attribute_model, genres=['Drama', 'Comedy'])
+    assert list(attribute_model['movie_ids'][mask]) == expected_ids(shared_db_path, """
+    SELECT mg.movie_id FROM movie_genre mg JOIN genre g ON g.genre_id = mg.genre_id
+    WHERE g.genre_name IN ('Drama', 'Comedy') GROUP BY mg.movie_id HAVING COUNT(*) = 2;
+    """)
+
+
+def test_names_match_case_insensitively(attribute_model):
+    np.testing.assert_array_equal(
+        build_filter_mask(attribute_model, genres=['drama'], languages=['FR'], certificates=['pg-13']),
+        build_filter_mask(attribute_model, genres=['Drama'], languages=['fr'], certificates=['PG-13']),
+    )
+
+
+def test_ranges_and_no_constraints(attribute_model, shared_db_path):
+    assert build_filter_mask(attribute_model) is None
+    mask = build_filter_mask(attribute_model, min_year=1980, max_year=1990, max_runtime=120)
+    assert list(attribute_model['movie_ids'][mask]) == expected_ids(shared_db_path, """
+    SELECT movie_id FROM movie
+    WHERE CAST(strftime('%Y', release_date) AS INTEGER) BETWEEN 1980 AND 1990 AND runtime <= 120;
+    """)
+
+
+def test_unknown_names_are_reported_together(attribute_model):
+    with pytest.raises(ValueError, match="'Western', 'Noir'.*choose from"):
+        build_filter_mask(attribute_model, genres=['Drama', 'Western', 'Noir'])
+
+
+def test_missing_attributes_raise_value_error():
+    with pytest.raises(ValueError, match="no genre attributes"):
+        build_filter_mask({'movie_ids': np.arange(3)}, genres=['Drama'])
+
+
+def test_masks_and_exclusions_apply_per_row():
+    scores = np.tile(np.arange(6, dtype=np.float64), (3, 1))
+    masks = [np.array([True, True, True, False, False, False]), None,
+             np.array([False, True, False, True, False, False])]
+    top = top_n_positions_batch(scores, np.array([1]), np.array([5]), [2, 2, 5], masks)
+    assert [list(positions) for positions in top] == [[2, 1], [4, 3], [3, 1]]
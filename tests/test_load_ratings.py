@@ -0,0 +1,104 @@
+# tests/test_load_ratings.py
+
+import csv
+import json
+import os
+import sqlite3
+
+import pytest
+
+import load_movie_data
+from load_movie_data import load_ratings, load_kaggle_data, normalise_date, create_tables
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def load_csv(db_path, monkeypatch):
+    """
+    Load a ratings CSV body into the test database and return the connection.
+    """
+    conn = sqlite3.connect(db_path)
+
+    def load(lines):
+        text = 'UserID,MovieID,Rating,Date\n' + '\n'.join(lines) + '\n'
+        monkeypatch.setattr(load_movie_data.requests, 'get', lambda url: FakeResponse(text))
+        load_ratings(conn, 'ratings.csv')
+        return conn
+
+    yield load
+    conn.close()
+
+
+def test_normalise_date():
+    assert normalise_date('2020-1-5') == '2020-01-05'
+    assert normalise_date('2020-01-05') == '2020-01-05'
+    assert normalise_date('2021-02-30') is None
+    assert normalise_date('') is None
+
+
+@pytest.mark.parametrize('rating, valid', [
+    ('4', True), ('4.5', True), ('4.50', True), ('.5', True),
+    ('4..5', False), ('4.5.', False), ('.', False), ('1e0', False), ('3.2', False), ('5.5', False), ('0', False),
+])
+def test_rating_text_must_be_a_half_star(load_csv, rating, valid):
+    conn = load_csv([f"1000,1,{rating},2020-01-01"])
+    loaded = conn.execute("SELECT rating FROM rating WHERE user_id = 1000;").fetchall()
+    rejected = conn.execute("SELECT reason FROM load_reject WHERE source = 'ratings';").fetchall()
+    if valid:
+        assert loaded == [(float(rating),)] and rejected == []
+    else:
+        assert loaded == [] and rejected == [('invalid rating',)]
+
+
+def test_single_digit_dates_are_normalised(load_csv):
+    conn = load_csv(["1000,1,4,2020-1-5", "1000,2,4,2020-02-30", "1000,3,4,2020-11-09"])
+    dates = conn.execute("SELECT movie_id, rating_date FROM rating WHERE user_id = 1000 ORDER BY movie_id;").fetchall()
+    assert dates == [(1, '2020-01-05'), (2, None), (3, '2020-11-09')]
+
+    # The dropped date is recorded with its raw text
+    rejects = conn.execute("SELECT reason, record FROM load_reject WHERE source = 'ratings';").fetchall()
+    assert [(reason, json.loads(record)['rating_date']) for reason, record in rejects] == [
+        ('invalid rating_date, loaded without it', '2020-02-30')
+    ]
+
+
+def test_rejected_rows_keep_raw_dates(load_csv):
+    conn = load_csv(["1000,1,9,2020-1-5", "1000,2,4,"])
+    rejects = conn.execute("SELECT reason, record FROM load_reject WHERE source = 'ratings';").fetchall()
+    assert [(reason, json.loads(record)['rating_date']) for reason, record in rejects] == [
+        ('invalid rating', '2020-1-5')
+    ]
+    # A missing date is not an invalid one
+    assert conn.execute("SELECT rating_date FROM rating WHERE user_id = 1000;").fetchall() == [(None,)]
+
+
+def test_schema_rejects_off_step_ratings(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO rating VALUES (1000, 599, 3.5, NULL);")
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO rating VALUES (1000, 600, 3.2, NULL);")
+    conn.close()
+
+
+def test_every_kaggle_row_is_read(tmp_path):
+    kaggle_path = os.path.join(os.path.dirname(load_movie_data.__file__), '..', 'data', 'imdb_top_1000.csv')
+    with open(kaggle_path, 'r', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f, skipinitialspace=True))
+    conn = sqlite3.connect(str(tmp_path / 'movies.db'))
+    create_tables(conn)
+    load_kaggle_data(conn, 'imdb_top_1000.csv')
+
+    # The first data row used to be consumed as the header
+    first = rows[0]
+    overview = conn.execute("SELECT overview FROM movie WHERE original_title = ?;", (first['Series_Title'],)).fetchone()
+    assert overview == (first['Overview'],)
+    titles = conn.execute("SELECT COUNT(*), COUNT(overview) FROM movie;").fetchone()
+    assert titles == (len({row['Series_Title'] for row in rows}),) * 2
+    conn.close()
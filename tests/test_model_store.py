@@ -0,0 +1,64 @@
+# tests/test_model_store.py
+
+import os
+
+import numpy as np
+import scipy.sparse as sp
+
+from model_store import save_arrays, publish_arrays, load_arrays, sparse_to_arrays, sparse_from_arrays
+
+
+def test_arrays_round_trip_as_read_only_maps(tmp_path):
+    save_arrays({'a': np.arange(5), 'b': np.eye(2, dtype=np.float32)}, str(tmp_path))
+    arrays = load_arrays(str(tmp_path))
+    assert isinstance(arrays['a'], np.memmap)
+    assert not arrays['a'].flags.writeable
+    np.testing.assert_array_equal(arrays['b'], np.eye(2))
+
+
+def test_sparse_round_trip(tmp_path):
+    matrix = sp.random(6, 9, density=0.3, format='csr', dtype=np.float32, random_state=0)
+    save_arrays(sparse_to_arrays('features', matrix), str(tmp_path))
+    assert abs(sparse_from_arrays(load_arrays(str(tmp_path)), 'features') - matrix).max() == 0
+
+
+def test_publish_replaces_whole_model(tmp_path):
+    model_dir = str(tmp_path / 'model' / 'collab')
+    publish_arrays({'movie_ids': np.arange(3), 'stale': np.zeros(1)}, model_dir)
+    first = load_arrays(model_dir)
+
+    publish_arrays({'movie_ids': np.arange(4)}, model_dir)
+    second = load_arrays(model_dir)
+    assert os.path.islink(model_dir)
+    assert 'stale' not in second
+    assert len(second['movie_ids']) == 4
+    # A model attached before the publish keeps reading its own generation
+    assert len(first['movie_ids']) == 3
+
+
+def test_publish_extend_shares_current_arrays(tmp_path):
+    model_dir = str(tmp_path / 'collab')
+    publish_arrays({'item_factors': np.ones((3, 2))}, model_dir)
+    publish_arrays({'item_factors_scale': np.ones(3)}, model_dir, extend=True)
+    arrays = load_arrays(model_dir)
+    assert set(arrays) == {'item_factors', 'item_factors_scale'}
+    assert os.stat(os.path.join(model_dir, 'item_factors.npy')).st_nlink == 2
+
+
+def test_publish_migrates_plain_model_directory(tmp_path):
+    model_dir = str(tmp_path / 'content')
+    save_arrays({'old': np.zeros(2)}, model_dir)
+    publish_arrays({'new': np.ones(2)}, model_dir)
+    assert set(load_arrays(model_dir)) == {'new'}
+
+
+def test_models_publish_through_pointer_files(tmp_path, monkeypatch):
+    def no_symlinks(*args, **kwargs):
+        raise OSError("symbolic links are not available")
+
+    monkeypatch.setattr(os, 'symlink', no_symlinks)
+    model_dir = str(tmp_path / 'collab')
+    publish_arrays({'movie_ids': np.arange(3)}, model_dir)
+    publish_arrays({'user_ids': np.arange(2)}, model_dir, extend=True)
+    assert not os.path.lexists(model_dir)
+    assert sorted(load_arrays(model_dir)) == ['movie_ids', 'user_ids']
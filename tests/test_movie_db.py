@@ -0,0 +1,106 @@
+# tests/test_movie_db.py
+
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import movie_db
+from movie_db import (
+    new_generation_path, publish_generation, prune_generations, resolve_generation, generation_key,
+    connect_readonly
+)
+from snapshot import export_snapshot, load_snapshot_table
+
+
+def build_generation(db_path, value):
+    build_path = new_generation_path(db_path)
+    os.makedirs(os.path.dirname(build_path), exist_ok=True)
+    conn = sqlite3.connect(build_path)
+    conn.execute("CREATE TABLE t (value INTEGER);")
+    conn.execute("INSERT INTO t VALUES (?);", (value,))
+    conn.commit()
+    conn.close()
+    return build_path
+
+
+def read_value(db_path):
+    conn = connect_readonly(db_path)
+    value = conn.execute("SELECT value FROM t;").fetchone()[0]
+    conn.close()
+    return value
+
+
+def generation_files(db_path):
+    return sorted(os.listdir(movie_db.generations_dir_for(db_path)))
+
+
+def test_replaced_generations_outlive_the_grace_period(tmp_path):
+    db_path = str(tmp_path / 'movies.db')
+    paths = [build_generation(db_path, value) for value in range(3)]
+    for path in paths:
+        publish_generation(path, db_path)
+
+    # Within the grace period every replaced generation is kept for readers that still use it
+    assert len(generation_files(db_path)) == 3
+    assert read_value(db_path) == 2
+
+    prune_generations(db_path, grace_seconds=0)
+    assert generation_files(db_path) == [os.path.basename(paths[-1])]
+    assert read_value(db_path) == 2
+
+
+def test_open_generations_stay_readable_after_pruning(tmp_path):
+    db_path = str(tmp_path / 'movies.db')
+    publish_generation(build_generation(db_path, 1), db_path)
+    reader = connect_readonly(db_path)
+
+    publish_generation(build_generation(db_path, 2), db_path)
+    prune_generations(db_path, grace_seconds=0)
+    assert reader.execute("SELECT value FROM t;").fetchone()[0] == 1
+    reader.close()
+
+
+def no_symlinks(*args, **kwargs):
+    raise OSError("symbolic links are not available")
+
+
+def test_pointer_file_fallback(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'movies.db')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(os, 'symlink', no_symlinks)
+        first = build_generation(db_path, 1)
+        publish_generation(first, db_path)
+        assert not os.path.lexists(db_path)
+        assert resolve_generation(db_path) == os.path.realpath(first)
+        assert read_value(db_path) == 1
+
+    # Once symlinks work again the symlink takes over and the pointer file goes away
+    publish_generation(build_generation(db_path, 2), db_path)
+    assert os.path.islink(db_path)
+    assert not os.path.exists(db_path + movie_db.POINTER_SUFFIX)
+    assert read_value(db_path) == 2
+
+
+@pytest.mark.parametrize('symlinks', [True, False])
+def test_snapshot_is_keyed_on_the_generation(shared_db_path, tmp_path, monkeypatch, symlinks):
+    db_path = str(tmp_path / 'movies.db')
+    if not symlinks:
+        monkeypatch.setattr(os, 'symlink', no_symlinks)
+    first = new_generation_path(db_path)
+    os.makedirs(os.path.dirname(first))
+    shutil.copyfile(shared_db_path, first)
+    publish_generation(first, db_path)
+    assert os.path.lexists(db_path) == symlinks
+    export_snapshot(db_path)
+    assert load_snapshot_table(db_path, 'rating') is not None
+
+    # A new generation with the same modification time still invalidates the snapshot
+    second = new_generation_path(db_path)
+    shutil.copyfile(first, second)
+    os.utime(second, (os.path.getmtime(first),) * 2)
+    publish_generation(second, db_path)
+    assert generation_key(db_path)['source'] == os.path.realpath(second)
+    assert load_snapshot_table(db_path, 'rating') is None
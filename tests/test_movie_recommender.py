@@ -0,0 +1,20 @@
+# tests/test_movie_recommender.py
+
+import movie_recommender
+
+
+def test_serving_path_avoids_heavy_imports():
+    for name, (modules, _) in movie_recommender.STARTUP_CHECKS.items():
+        _, heavy = movie_recommender.measure_startup(modules)
+        assert heavy == [], f"{name} imports {heavy}"
+
+
+def test_parser_routes_subcommands():
+    parser = movie_recommender.build_parser()
+    args = parser.parse_args(['recommend', '--method', 'profile', '-n', '5', '--genre', 'Drama', '42'])
+    assert args.func is movie_recommender.command_recommend
+    assert (args.method, args.n, args.genre, args.user_id) == ('profile', 5, ['Drama'], 42)
+
+    args = parser.parse_args(['train', '--method', 'collab', '--quantize', 'int8'])
+    assert args.func is movie_recommender.command_train
+    assert args.quantize == 'int8'
@@ -0,0 +1,59 @@
+# tests/test_movie_search.py
+
+import sqlite3
+
+from movie_search import (
+    build_match_query, search_movies, find_movie_id, drop_search_triggers, create_search_triggers,
+    rebuild_search_index
+)
+
+
+def test_build_match_query_quotes_words_and_prefixes_last():
+    assert build_match_query('The Dark Kni') == '"the" "dark" "kni"*'
+    assert build_match_query('"* -') is None
+
+
+def test_movie_id_is_the_rowid(db_path):
+    conn = sqlite3.connect(db_path)
+    plan = ' '.join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN SELECT * FROM movie WHERE movie_id = 5;"))
+    assert 'INTEGER PRIMARY KEY' in plan
+    conn.close()
+
+
+def test_search_finds_titles_by_prefix(shared_db_path):
+    conn = sqlite3.connect(shared_db_path)
+    assert find_movie_id(conn, 'Movie 12 wa') == 12
+    assert search_movies(conn, '') == []
+    conn.close()
+
+
+def test_triggers_keep_index_in_sync(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO movie (movie_id, original_title) VALUES (1000, 'Zyzzyva Returns');")
+    assert search_movies(conn, 'zyzzyva') == [1000]
+
+    conn.execute("UPDATE movie SET original_title = 'Quokka Rising' WHERE movie_id = 1000;")
+    assert search_movies(conn, 'zyzzyva') == []
+    assert search_movies(conn, 'quokka') == [1000]
+
+    conn.execute("DELETE FROM movie WHERE movie_id = 1000;")
+    assert search_movies(conn, 'quokka') == []
+    conn.close()
+
+
+def test_suspended_triggers_are_restored(db_path):
+    conn = sqlite3.connect(db_path)
+    trigger_sql = drop_search_triggers(conn)
+    assert len(trigger_sql) == 3
+    conn.execute("INSERT INTO movie (movie_id, original_title) VALUES (1000, 'Zyzzyva Returns');")
+    assert search_movies(conn, 'zyzzyva') == []
+
+    # A bulk rebuild indexes the new movie and leaves the triggers suspended
+    rebuild_search_index(conn)
+    assert search_movies(conn, 'zyzzyva') == [1000]
+    assert drop_search_triggers(conn) == []
+
+    create_search_triggers(conn, trigger_sql)
+    conn.execute("INSERT INTO movie (movie_id, original_title) VALUES (1001, 'Zyzzyva Again');")
+    assert sorted(search_movies(conn, 'zyzzyva')) == [1000, 1001]
+    conn.close()
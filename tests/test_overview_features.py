@@ -0,0 +1,47 @@
+# tests/test_overview_features.py
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from content_filtering import (
+    OVERVIEW_N_FEATURES, hash_overviews, compute_idf, apply_tfidf, load_overview_features,
+    load_aligned_overview_features
+)
+
+
+def test_chunked_features_match_one_pass(shared_db_path):
+    conn = sqlite3.connect(shared_db_path)
+    rows = conn.execute("SELECT movie_id, overview FROM movie ORDER BY movie_id;").fetchall()
+    conn.close()
+    counts = hash_overviews([overview for _, overview in rows])
+    idf = compute_idf(np.bincount(counts.indices, minlength=OVERVIEW_N_FEATURES), len(rows))
+    expected = apply_tfidf(counts, idf)
+
+    movie_ids, matrix, chunked_idf = load_overview_features(shared_db_path, chunk_size=7)
+    assert list(movie_ids) == [movie_id for movie_id, _ in rows]
+    np.testing.assert_allclose(chunked_idf, idf)
+    assert abs(matrix - expected).max() < 1e-6
+
+
+def test_null_overviews_give_empty_rows(shared_db_path):
+    movie_ids, matrix, _ = load_overview_features(shared_db_path)
+    conn = sqlite3.connect(shared_db_path)
+    null_ids = {movie_id for (movie_id,) in conn.execute("SELECT movie_id FROM movie WHERE overview IS NULL;")}
+    conn.close()
+    assert null_ids
+    row_nnz = np.diff(matrix.indptr)
+    assert all(row_nnz[i] == 0 for i, movie_id in enumerate(movie_ids) if movie_id in null_ids)
+
+
+def test_alignment_fills_movies_without_overview_row(shared_db_path):
+    movies_df = pd.DataFrame({'movie_id': [3, 99999, 1]})
+    aligned = load_aligned_overview_features(shared_db_path, movies_df)
+    movie_ids, matrix, _ = load_overview_features(shared_db_path)
+    position = {movie_id: i for i, movie_id in enumerate(movie_ids)}
+
+    assert aligned.shape == (3, OVERVIEW_N_FEATURES)
+    assert abs(aligned[0] - matrix[position[3]]).max() == 0
+    assert aligned[1].nnz == 0
+    assert abs(aligned[2] - matrix[position[1]]).max() == 0
@@ -0,0 +1,126 @@
+# tests/test_profile_cache.py
+
+import asyncio
+import functools
+import io
+
+import numpy as np
+import pytest
+
+from model_store import load_arrays, recommend_batch, batch_rated_items
+from profile_cache import ProfileCache, NEW_RATING_BYTES
+from request_batcher import serve_lines
+from sharded_scoring import ShardedScorer
+
+
+@pytest.fixture(scope='module')
+def model(model_dirs):
+    return load_arrays(model_dirs['profile'])
+
+
+def user_ids_of(model, count=20):
+    return [int(user_id) for user_id in model['rating_user_ids'][:count]]
+
+
+def unrated_position(model, user_id):
+    _, rated_items, _, _ = batch_rated_items(model, [user_id])
+    return int(np.setdiff1d(np.arange(len(model['movie_ids'])), rated_items)[0])
+
+
+def assert_same_recommendations(first, second):
+    for expected, actual in zip(first, second):
+        assert [movie['movie_id'] for movie in actual] == [movie['movie_id'] for movie in expected]
+        np.testing.assert_allclose([movie['similarity_score'] for movie in actual],
+                                   [movie['similarity_score'] for movie in expected], rtol=1e-5, atol=1e-7)
+
+
+@pytest.mark.parametrize('weighting', ['content', 'profile'])
+def test_cached_profiles_match_uncached(model, weighting):
+    user_ids = user_ids_of(model)
+    cache = ProfileCache(model, weighting)
+    expected = recommend_batch(model, weighting, user_ids, [10] * len(user_ids))
+    for _ in range(2):
+        assert_same_recommendations(expected, recommend_batch(model, weighting, user_ids, [10] * len(user_ids),
+                                                              profile_cache=cache))
+    assert cache.stats()['hits'] == len(user_ids)
+
+
+def test_incremental_update_matches_rebuild(model):
+    user_id = user_ids_of(model)[0]
+    movie_id = int(model['movie_ids'][5])
+    updated = ProfileCache(model, 'profile')
+    recommend_batch(model, 'profile', [user_id], [10], profile_cache=updated)
+    updated.add_rating(user_id, movie_id, 5.0)
+
+    rebuilt = ProfileCache(model, 'profile')
+    rebuilt.add_rating(user_id, movie_id, 5.0)
+    assert_same_recommendations(
+        recommend_batch(model, 'profile', [user_id], [10], profile_cache=rebuilt),
+        recommend_batch(model, 'profile', [user_id], [10], profile_cache=updated),
+    )
+
+
+def test_rating_added_during_a_build_is_not_lost(model, monkeypatch):
+    user_id = user_ids_of(model)[0]
+    position = unrated_position(model, user_id)
+    movie_id = int(model['movie_ids'][position])
+    cache = ProfileCache(model, 'profile')
+    build_entries = cache.build_entries
+
+    def build_then_rate(user_ids, new_ratings, reference_day):
+        entries = build_entries(user_ids, new_ratings, reference_day)
+        # Another thread adds a rating while this build runs outside the lock
+        cache.add_rating(user_id, movie_id, 5.0)
+        return entries
+
+    monkeypatch.setattr(cache, 'build_entries', build_then_rate)
+    cache.profiles_batch([user_id])
+    monkeypatch.setattr(cache, 'build_entries', build_entries)
+
+    # The stale entry was not cached, so the next request rebuilds it with the rating
+    assert user_id not in cache.entries
+    _, _, _, rated_items = cache.profiles_batch([user_id])
+    assert position in rated_items
+
+
+def test_new_ratings_count_against_the_cap(model):
+    user_ids = user_ids_of(model, 4)
+    movie_id = int(model['movie_ids'][0])
+    cache = ProfileCache(model, 'profile', max_bytes=3 * NEW_RATING_BYTES)
+    for user_id in user_ids:
+        cache.add_rating(user_id, movie_id, 4.0)
+
+    stats = cache.stats()
+    assert stats['bytes'] <= cache.max_bytes
+    assert stats['new_ratings'] == 3 and stats['dropped_ratings'] == 1
+    # The least recently rating user's rating was dropped
+    assert user_ids[0] not in cache.new_ratings and user_ids[-1] in cache.new_ratings
+
+
+def test_sharded_rating_without_cache_is_refused(model_dirs):
+    with ShardedScorer(model_dirs['profile'], 'profile', 1, profile_cache_bytes=0) as scorer:
+        with pytest.raises(RuntimeError):
+            scorer.add_rating(1, 1, 5.0)
+
+
+def test_serve_lines_takes_ratings(model, capsys):
+    cache = ProfileCache(model, 'profile')
+    user_id = user_ids_of(model)[0]
+    position = unrated_position(model, user_id)
+    movie_id = int(model['movie_ids'][position])
+    lines = io.StringIO(f"rate {user_id} {movie_id} 5\nrate {user_id} 999999 5\n{user_id}\n")
+
+    asyncio.run(serve_lines(functools.partial(recommend_batch, model, 'profile', profile_cache=cache),
+                            input_stream=lines, add_rating=cache.add_rating))
+
+    output = capsys.readouterr().out.splitlines()
+    assert output[0] == f"{user_id}: rated {movie_id}"
+    assert output[1] == "Error: Unknown movie_id: 999999"
+    assert output[2].startswith(f"{user_id}: ")
+    assert position in cache.new_ratings[user_id]
+
+
+def test_serve_lines_reports_models_without_ratings(model, capsys):
+    lines = io.StringIO("rate 1 1 5\n")
+    asyncio.run(serve_lines(functools.partial(recommend_batch, model, 'profile'), input_stream=lines))
+    assert capsys.readouterr().out.startswith("Error: ")
@@ -0,0 +1,29 @@
+# tests/test_profile_scoring.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import content_filtering
+import model_store
+from content_filtering import get_top_n_profile_recommendations
+from model_store import load_arrays, sparse_from_arrays, recommend_batch, profile_weights
+
+
+def test_neutral_rating_is_defined_once():
+    assert content_filtering.PROFILE_NEUTRAL_RATING is model_store.PROFILE_NEUTRAL_RATING
+    np.testing.assert_array_equal(profile_weights([model_store.PROFILE_NEUTRAL_RATING], 'profile'), [0])
+
+
+@pytest.mark.parametrize('user_id', [1, 7, 42])
+def test_served_profiles_match_offline_scoring(model_dirs, shared_db_path, user_id):
+    model = load_arrays(model_dirs['profile'])
+    movies_df = pd.DataFrame({'movie_id': model['movie_ids'], 'original_title': model['titles']})
+    feature_matrix = sparse_from_arrays(model, 'features')
+
+    offline = get_top_n_profile_recommendations(user_id, movies_df, feature_matrix, shared_db_path, n=10)
+    served, = recommend_batch(model, 'profile', [user_id], [10])
+
+    np.testing.assert_allclose([r['similarity_score'] for r in served],
+                               [r['similarity_score'] for r in offline], rtol=1e-5)
+    assert {r['movie_id'] for r in served} == {int(r['movie_id']) for r in offline}
@@ -0,0 +1,54 @@
+# tests/test_quantized_scoring.py
+
+import numpy as np
+import pytest
+
+from model_store import publish_collab_model, load_arrays, score_top_n_batch
+from quantized_scoring import INT8_LIMIT, quantize_rows, has_quantized_arrays
+
+
+@pytest.mark.parametrize('dtype', ['int8', 'float16'])
+def test_rows_dequantize_within_one_step(dtype):
+    matrix = np.random.default_rng(0).normal(size=(20, 8))
+    matrix[3] = 0
+    quantized, scale = quantize_rows(matrix, dtype)
+    restored = quantized.astype(np.float32) * scale[:, None]
+    step = scale if dtype == 'int8' else scale / 1024
+    assert np.all(np.abs(restored - matrix) <= step[:, None])
+    assert np.abs(quantized).max() <= (INT8_LIMIT if dtype == 'int8' else 1)
+
+
+@pytest.fixture(scope='module')
+def quantized_dir(shared_db_path, tmp_path_factory):
+    model_dir = str(tmp_path_factory.mktemp('quantized') / 'collab')
+    publish_collab_model(shared_db_path, model_dir, quantize='int8')
+    return model_dir
+
+
+def test_quantized_top_n_matches_full_precision(quantized_dir):
+    model = load_arrays(quantized_dir)
+    assert has_quantized_arrays(model, 'collab')
+    user_ids = list(model['rating_user_ids'][:30])
+    ns = [10] * len(user_ids)
+
+    full = score_top_n_batch(model, 'collab', user_ids, ns)
+    quantized = score_top_n_batch(model, 'collab', user_ids, ns, quantized=True)
+    for (_, full_scores), (_, quantized_scores) in zip(full, quantized):
+        # Candidates are re-scored exactly, so the returned scores are the full-precision ones
+        np.testing.assert_allclose(quantized_scores, full_scores, rtol=1e-5)
+
+
+def test_content_methods_are_not_quantized(model_dirs):
+    model = load_arrays(model_dirs['content'])
+    assert not has_quantized_arrays(model, 'profile')
+    with pytest.raises(ValueError, match='only available for collab'):
+        score_top_n_batch(model, 'profile', list(model['rating_user_ids'][:2]), [5, 5], quantized=True)
+
+
+def test_republish_without_quantize_drops_quantized_arrays(shared_db_path, tmp_path):
+    model_dir = str(tmp_path / 'collab')
+    publish_collab_model(shared_db_path, model_dir, quantize='float16')
+    assert has_quantized_arrays(load_arrays(model_dir), 'collab')
+
+    publish_collab_model(shared_db_path, model_dir)
+    assert not has_quantized_arrays(load_arrays(model_dir), 'collab')
@@ -0,0 +1,88 @@
+# tests/test_request_batcher.py
+
+import asyncio
+import io
+import threading
+
+import pytest
+
+from request_batcher import RecommendationBatcher, serve_lines
+
+
+def echo_batch(user_ids, ns, masks):
+    return [[user_id] * n for user_id, n in zip(user_ids, ns)]
+
+
+def test_concurrent_requests_are_batched():
+    batch_sizes = []
+
+    def recommend_batch(user_ids, ns, masks):
+        batch_sizes.append(len(user_ids))
+        return echo_batch(user_ids, ns, masks)
+
+    async def run():
+        async with RecommendationBatcher(recommend_batch, max_batch_size=8, max_wait_ms=50) as batcher:
+            return await asyncio.gather(*(batcher.recommend(user_id, 2) for user_id in range(20)))
+
+    results = asyncio.run(run())
+    assert results == [[user_id, user_id] for user_id in range(20)]
+    assert max(batch_sizes) == 8
+    assert sum(batch_sizes) == 20
+
+
+def test_stop_answers_queued_requests():
+    release = threading.Event()
+
+    def slow_batch(user_ids, ns, masks):
+        release.wait(5)
+        return echo_batch(user_ids, ns, masks)
+
+    async def run():
+        batcher = RecommendationBatcher(slow_batch, max_batch_size=2, max_wait_ms=1000, num_threads=1)
+        await batcher.start()
+        requests = [asyncio.create_task(batcher.recommend(user_id, 1)) for user_id in range(5)]
+        await asyncio.sleep(0.05)
+        release.set()
+        await batcher.stop()
+        return await asyncio.wait_for(asyncio.gather(*requests), 1)
+
+    assert asyncio.run(run()) == [[user_id] for user_id in range(5)]
+
+
+def test_scoring_errors_reach_every_caller():
+    def failing_batch(user_ids, ns, masks):
+        raise ValueError("boom")
+
+    async def run():
+        async with RecommendationBatcher(failing_batch) as batcher:
+            return await asyncio.gather(*(batcher.recommend(user_id) for user_id in range(3)),
+                                        return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in asyncio.run(run()))
+
+
+def test_recommend_requires_a_running_batcher():
+    async def run():
+        batcher = RecommendationBatcher(echo_batch)
+        with pytest.raises(RuntimeError, match="not running"):
+            await batcher.recommend(1)
+        async with batcher:
+            pass
+        with pytest.raises(RuntimeError, match="not running"):
+            await batcher.recommend(1)
+
+    asyncio.run(run())
+
+
+def test_serve_lines_answers_failed_requests(capsys):
+    def failing_batch(user_ids, ns, masks):
+        if 2 in user_ids:
+            raise RuntimeError("shard [0, 256): boom")
+        return [[{'title': f"movie {user_id}"}] * n for user_id, n in zip(user_ids, ns)]
+
+    asyncio.run(serve_lines(failing_batch, n=1, input_stream=io.StringIO("1\n2\n3\n")))
+
+    # Every line gets an answer and the server keeps going after a failure
+    output = capsys.readouterr().out.splitlines()
+    assert len(output) == 3
+    assert "Error: shard [0, 256): boom" in output
@@ -0,0 +1,74 @@
+# tests/test_sharded_scoring.py
+
+import numpy as np
+import pytest
+
+from model_store import (
+    SCORE_KEYS, load_arrays, publish_arrays, recommend_batch, score_top_n_batch, build_filter_mask
+)
+import sharded_scoring
+from sharded_scoring import ShardedScorer, shard_bounds, shard_masks, merge_top_n
+
+
+def test_shard_bounds_cover_catalog_on_block_edges():
+    bounds = shard_bounds(1000, 3)
+    assert bounds[0][0] == 0 and bounds[-1][1] == 1000
+    assert all(end == next_start for (_, end), (next_start, _) in zip(bounds, bounds[1:]))
+    assert all(start % 256 == 0 for start, _ in bounds)
+
+
+def test_shard_masks_slice_shared_masks_once():
+    mask = np.arange(10) % 2 == 0
+    sliced = shard_masks([mask, None, mask], 4, 8)
+    assert sliced[0] is sliced[2]
+    assert sliced[1] is None
+    np.testing.assert_array_equal(sliced[0], mask[4:8])
+
+
+def test_ties_return_at_most_n_per_shard():
+    # A cold user's content scores are all zero: every movie ties
+    scores = np.zeros((1, 500))
+    from model_store import top_n_positions_batch
+    top = top_n_positions_batch(scores, np.empty(0, dtype=int), np.empty(0, dtype=int), [5])
+    assert list(top[0]) == [0, 1, 2, 3, 4]
+
+    shard_results = [[(np.arange(5) + offset, np.zeros(5))] for offset in (0, 256)]
+    positions, _ = merge_top_n(shard_results, [3])[0]
+    assert list(positions) == [0, 1, 2]
+
+
+@pytest.mark.parametrize('method', ['collab', 'content', 'profile'])
+def test_sharded_matches_unsharded(model_dirs, method):
+    model = load_arrays(model_dirs[method])
+    user_ids = [int(user_id) for user_id in model['rating_user_ids'][:20]] + [999999]
+    ns = [5] * len(user_ids)
+    mask = build_filter_mask(model, genres=['drama'])
+    masks = [mask if index % 2 else None for index in range(len(user_ids))]
+
+    expected = recommend_batch(model, method, user_ids, ns, masks)
+    with ShardedScorer(model_dirs[method], method, 2) as scorer:
+        assert scorer.recommend_batch(user_ids, ns, masks) == expected
+
+
+def test_worker_errors_are_raised(model_dirs):
+    with ShardedScorer(model_dirs['collab'], 'collab', 1) as scorer:
+        with pytest.raises(RuntimeError, match='shard'):
+            scorer.recommend_batch([1], [5], [np.zeros(3, dtype=bool)])
+
+
+def test_shards_attach_the_coordinators_generation(model_dirs, tmp_path, monkeypatch):
+    model_dir = str(tmp_path / 'collab')
+    publish_arrays({name: np.array(array) for name, array in load_arrays(model_dirs['collab']).items()}, model_dir)
+    model = load_arrays(model_dir)
+    user_ids = [int(user_id) for user_id in model['rating_user_ids'][:10]]
+    expected = recommend_batch(model, 'collab', user_ids, [5] * len(user_ids))
+
+    def load_then_publish(path):
+        arrays = load_arrays(path)
+        # A reload publishes a different model after the coordinator attached its generation
+        publish_arrays({'item_biases': -np.array(arrays['item_biases'])}, model_dir, extend=True)
+        return arrays
+
+    monkeypatch.setattr(sharded_scoring, 'load_arrays', load_then_publish)
+    with ShardedScorer(model_dir, 'collab', 2) as scorer:
+        assert scorer.recommend_batch(user_ids, [5] * len(user_ids)) == expected
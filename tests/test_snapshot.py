@@ -0,0 +1,81 @@
+# tests/test_snapshot.py
+
+import os
+import shutil
+import sqlite3
+
+import numpy as np
+
+import content_filtering
+import snapshot
+from snapshot import export_snapshot, load_snapshot_table, decode_strings, snapshot_dir_for
+
+
+def test_columns_match_database(db_path, monkeypatch):
+    # Export in chunks smaller than the table so rows span several writes
+    monkeypatch.setattr(snapshot, 'EXPORT_CHUNK_SIZE', 37)
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE movie SET english_title = 'Été ' || movie_id WHERE movie_id % 3 = 0;")
+    conn.execute("UPDATE movie SET no_of_votes = movie_id WHERE movie_id % 2 = 0;")
+    conn.commit()
+    rows = conn.execute("""
+    SELECT movie_id, english_title, overview, no_of_votes, imdb_rating, release_date
+    FROM movie ORDER BY rowid;
+    """).fetchall()
+    conn.close()
+
+    export_snapshot(db_path)
+    movie = load_snapshot_table(db_path, 'movie')
+    movie_ids, titles, overviews, votes, ratings, dates = zip(*rows)
+
+    assert list(movie['movie_id']) == list(movie_ids)
+    assert list(decode_strings(movie, 'english_title')) == list(titles)
+    assert list(decode_strings(movie, 'overview')) == list(overviews)
+    assert list(movie['no_of_votes_valid']) == [value is not None for value in votes]
+    np.testing.assert_allclose(movie['imdb_rating'], ratings)
+    assert list(movie['release_date'].astype(str)) == list(dates)
+    assert 'runtime_valid' not in movie
+
+
+def test_dictionary_is_a_byte_buffer(shared_db_path, tmp_path):
+    snapshot_dir = str(tmp_path / 'snapshot')
+    export_snapshot(shared_db_path, snapshot_dir)
+    movie = snapshot.load_arrays(os.path.join(snapshot_dir, 'movie'))
+
+    # Each distinct value takes its own length, not the longest value's
+    offsets, buffer = movie['overview_offsets'], movie['overview_bytes']
+    assert buffer.dtype == np.uint8 and offsets.dtype == np.int64
+    assert offsets[-1] == len(buffer)
+    values = [bytes(buffer[start:end]).decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])]
+    assert values == sorted(set(values))
+
+
+def test_empty_tables_export(shared_db_path, tmp_path):
+    snapshot_dir = str(tmp_path / 'snapshot')
+    export_snapshot(shared_db_path, snapshot_dir)
+    country = snapshot.load_arrays(os.path.join(snapshot_dir, 'country'))
+    assert all(len(array) == 0 for name, array in country.items() if not name.endswith('_offsets'))
+
+
+def test_stale_snapshot_is_ignored(db_path):
+    export_snapshot(db_path)
+    assert load_snapshot_table(db_path, 'rating') is not None
+    os.utime(db_path, (0, 0))
+    assert load_snapshot_table(db_path, 'rating') is None
+    shutil.rmtree(snapshot_dir_for(db_path))
+
+
+def test_features_fall_back_when_the_snapshot_goes_stale(db_path, monkeypatch):
+    export_snapshot(db_path)
+    expected = content_filtering.load_movie_features(db_path)
+    load_table = content_filtering.load_snapshot_table
+
+    def load_then_touch(*args):
+        # The database changes after the first table was read from the snapshot
+        arrays = load_table(*args)
+        os.utime(db_path, (0, 0))
+        return arrays
+
+    monkeypatch.setattr(content_filtering, 'load_snapshot_table', load_then_touch)
+    features = content_filtering.load_movie_features(db_path)
+    assert list(features['combined_features']) == list(expected['combined_features'])
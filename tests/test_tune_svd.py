@@ -0,0 +1,50 @@
+# tests/test_tune_svd.py
+
+import time
+
+import numpy as np
+
+import tune_svd
+from model_store import load_arrays
+
+
+def test_split_is_cached_per_fraction(shared_db_path, tmp_path, capsys):
+    split_dir = str(tmp_path / 'split')
+    tune_svd.build_split(shared_db_path, split_dir, validation_fraction=0.2)
+    n_validation = len(load_arrays(split_dir)['validation_ratings'])
+
+    tune_svd.build_split(shared_db_path, split_dir, validation_fraction=0.2)
+    assert "Reusing cached" in capsys.readouterr().out
+
+    tune_svd.build_split(shared_db_path, split_dir, validation_fraction=0.5)
+    assert "Reusing cached" not in capsys.readouterr().out
+    assert len(load_arrays(split_dir)['validation_ratings']) > n_validation
+
+
+def test_evaluate_config_stops_at_a_checkpoint(shared_db_path, tmp_path):
+    split_dir = str(tmp_path / 'split')
+    tune_svd.build_split(shared_db_path, split_dir)
+    params = {'n_factors': 5, 'lr_all': 0.005, 'reg_all': 0.02}
+
+    result = tune_svd.evaluate_config(split_dir, params, deadline=time.time() + 60)
+    assert result['n_epochs'] in tune_svd.EVAL_EPOCHS
+    assert np.isfinite(result['rmse'])
+
+    expired = tune_svd.evaluate_config(split_dir, params, deadline=time.time() - 1)
+    assert expired['n_epochs'] == 0
+
+
+def slow_evaluate(split_dir, params, deadline):
+    # Like evaluate_config: nothing is trained once the deadline has passed
+    if time.time() > deadline:
+        return {**params, 'n_epochs': 0, 'rmse': float('inf'), 'seconds': 0.0}
+    time.sleep(1.0)
+    return {**params, 'n_epochs': 10, 'rmse': 1.0, 'seconds': 1.0}
+
+
+def test_running_configs_are_collected_at_the_deadline(shared_db_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(tune_svd, 'evaluate_config', slow_evaluate)
+    results = tune_svd.run_search(shared_db_path, 'grid', budget_seconds=0.3, num_workers=1,
+                                  split_dir=str(tmp_path / 'split'))
+    # The first configuration was running when the budget ran out; the rest never started
+    assert len(results) == 1